@@ -0,0 +1,84 @@
+"""
+Compare the DTW backends on the reference dataset.
+
+Every reference clip is used in turn as the recorded sign and matched against
+all the other clips (leave-one-out). For each backend the script reports the
+total matching time, the top-1 accuracy (nearest clip has the same sign name)
+and the top-1 agreement with fastdtw, the default backend.
+
+    python benchmark_dtw.py [--compact] [--band-widths 3 5 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.dataset_utils import load_dataset, load_reference_signs
+from utils.dtw import dtw_distances
+
+
+def nearest_signs(reference_signs, **dtw_kwargs):
+    """
+    Each clip is matched against the whole index without itself (positions), so
+    only the DTW is timed, not the building of an index per query
+
+    :return: the name of the nearest other clip for each clip and the elapsed time
+    """
+    n = len(reference_signs)
+    # Partition caches built before the timing, not charged to the first backend
+    if n > 0:
+        reference_signs.candidates(reference_signs.sign_model(0))
+
+    queries = [
+        (reference_signs.sign_model(idx), np.delete(np.arange(n), idx)) for idx in range(n)
+    ]
+    predictions = []
+    elapsed = 0.0
+    for recorded_sign, positions in queries:
+        start = time.perf_counter()
+        ranking = dtw_distances(
+            recorded_sign, reference_signs, positions=positions, **dtw_kwargs
+        )
+        elapsed += time.perf_counter() - start
+        predictions.append(ranking.names[ranking.top_k(1)[0]])
+    return np.array(predictions), elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--band-widths", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--max-slopes", type=float, nargs="+", default=[2.0])
+    args = parser.parse_args()
+
+    videos = load_dataset()
+    reference_signs = load_reference_signs(videos, compact=args.compact)
+    names = reference_signs.names
+
+    configurations = [("fastdtw", dict(backend="fastdtw"))]
+    configurations.append(("exact", dict(backend="exact")))
+    for width in args.band_widths:
+        configurations.append(
+            (
+                f"exact sakoe_chiba r={width}",
+                dict(backend="exact", band="sakoe_chiba", band_width=width),
+            )
+        )
+    for slope in args.max_slopes:
+        configurations.append(
+            (
+                f"exact itakura s={slope}",
+                dict(backend="exact", band="itakura", max_slope=slope),
+            )
+        )
+
+    print(f"\n{len(reference_signs)} clips, leave-one-out\n")
+    print(f'{"backend":<28}{"time (s)":>10}{"top-1 acc":>11}{"agreement":>11}')
+    baseline = None
+    for label, dtw_kwargs in configurations:
+        predictions, elapsed = nearest_signs(reference_signs, **dtw_kwargs)
+        if baseline is None:
+            baseline = predictions
+        accuracy = np.mean(predictions == names)
+        agreement = np.mean(predictions == baseline)
+        print(f"{label:<28}{elapsed:>10.2f}{accuracy:>11.1%}{agreement:>11.1%}")
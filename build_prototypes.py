@@ -0,0 +1,81 @@
+"""
+Build the per-sign prototypes used by load_reference_signs(use_prototypes=True).
+
+The clips of each sign are reduced to a few prototype sequences (medoids or DBA
+averages) saved under data/prototypes. With --report, the script also measures
+the accuracy versus speedup trade-off: every clip is matched (leave-one-out)
+against all the other clips and against prototypes rebuilt without it.
+
+    python build_prototypes.py [--n-prototypes 1] [--method medoid|dba] [--compact] [--report]
+"""
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils.dataset_utils import load_dataset, load_reference_signs
+from utils.dtw import BatchDTWMatcher
+from utils.prototypes import PROTOTYPE_METHODS, build_prototypes, save_prototypes
+
+
+def predict(ranking, batch_size=5, threshold=0.2):
+    """Same vote as SignRecorder._get_sign_predicted"""
+    sign_names = ranking.names[ranking.top_k(batch_size)]
+    predicted_sign, count = Counter(sign_names).most_common()[0]
+    if count / batch_size < threshold:
+        return "Seña desconocida"
+    return predicted_sign
+
+
+def evaluate(reference_signs, n_prototypes, method):
+    """
+    :return: dictionary of (top-1 accuracy, vote accuracy, seconds per query)
+             for the full reference set and for the prototypes
+    """
+    results = {"all clips": [[], [], 0.0], "prototypes": [[], [], 0.0]}
+    for idx in range(len(reference_signs)):
+        recorded_sign = reference_signs.sign_model(idx)
+        name = reference_signs.names[idx]
+        others = reference_signs.subset(np.arange(len(reference_signs)) != idx)
+        sets = {
+            "all clips": others,
+            "prototypes": build_prototypes(others, n_prototypes, method),
+        }
+        for label, references in sets.items():
+            matcher = BatchDTWMatcher(references)
+            start = time.perf_counter()
+            ranking = matcher(recorded_sign)
+            results[label][2] += time.perf_counter() - start
+            results[label][0].append(ranking.names[ranking.top_k(1)[0]] == name)
+            results[label][1].append(predict(ranking) == name)
+
+    n = len(reference_signs)
+    return {
+        label: (np.mean(top1), np.mean(vote), elapsed / n)
+        for label, (top1, vote, elapsed) in results.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n-prototypes", type=int, default=1)
+    parser.add_argument("--method", choices=PROTOTYPE_METHODS, default="medoid")
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--report", action="store_true")
+    args = parser.parse_args()
+
+    videos = load_dataset()
+    reference_signs = load_reference_signs(videos, compact=args.compact)
+
+    prototypes = build_prototypes(reference_signs, args.n_prototypes, args.method)
+    save_prototypes(prototypes)
+    print(f"\n{len(reference_signs)} clips -> {len(prototypes)} prototypes\n")
+
+    if args.report:
+        report = evaluate(reference_signs, args.n_prototypes, args.method)
+        print(f'{"references":<14}{"top-1 acc":>11}{"vote acc":>10}{"ms/query":>10}')
+        for label, (top1, vote, elapsed) in report.items():
+            print(f"{label:<14}{top1:>11.1%}{vote:>10.1%}{elapsed * 1000:>10.1f}")
+        speedup = report["all clips"][2] / max(report["prototypes"][2], 1e-12)
+        print(f"\nSpeedup: x{speedup:.1f}")
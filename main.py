@@ -1,4 +1,5 @@
 import customtkinter as ctk
+from pages.camera_service import CameraService
 from pages.games_selector import GameSelectionPage
 from pages.abecedario import SenhaWindow
 from pages.lista_senas import ListaSenasWindow
@@ -24,6 +25,10 @@ class MainApp(ctk.CTk):
         
         self.frames = {}
         
+        # Cámara y Holistic compartidos por todas las páginas, se inician una sola vez
+        self.camera_service = CameraService()
+        self.camera_service.start()
+        
         # === Páginas ===
         # Menú principal
         self.menu_page = self.create_menu(container)
@@ -120,6 +125,7 @@ class MainApp(ctk.CTk):
             except:
                 pass
 
+        self.camera_service.stop()
         super().destroy()
 
 if __name__ == "__main__":
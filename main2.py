@@ -1,21 +1,43 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import mediapipe
 
 from utils.dataset_utils import load_dataset, load_reference_signs
 from utils.mediapipe_utils import mediapipe_detection
-from sign_recorder import SignRecorder
+from sign_recorder import MATCHERS, SignRecorder, make_matcher
+from sign_spotter import SignSpotter
 from webcam_manager import WebcamManager
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # "exact" DTW releases the GIL while classifying but ranks differently,
+    # "signature" only runs DTW on the references with the nearest signatures
+    parser.add_argument("--matcher", choices=MATCHERS, default="fastdtw")
+    # Continuous recognition: signs are spotted in the stream, without recording
+    parser.add_argument("--spot", action="store_true")
+    args = parser.parse_args()
+
     # Create dataset of the videos where landmarks have not been extracted yet
     videos = load_dataset()
 
-    # Create a DataFrame of reference signs (name: str, model: SignModel, distance: int)
+    # Create the index of reference signs (names, embeddings, distances)
     reference_signs = load_reference_signs(videos)
 
-    # Object that stores mediapipe results and computes sign similarities
-    sign_recorder = SignRecorder(reference_signs)
+    # Object that stores mediapipe results and computes sign similarities,
+    # in a worker thread so the webcam loop does not freeze after each recording
+    if args.spot:
+        # Same interface, "r" only resets the spotting state
+        sign_recorder = SignSpotter(reference_signs)
+    else:
+        sign_recorder = SignRecorder(
+            reference_signs,
+            matcher=make_matcher(args.matcher, reference_signs),
+            executor=ThreadPoolExecutor(max_workers=1),
+        )
+    sign_detected = ""
 
     # Object that draws keypoints & displays results
     webcam_manager = WebcamManager()
@@ -53,7 +75,13 @@ if __name__ == "__main__":
             image, results = mediapipe_detection(frame, holistic)
 
             # Process results
-            sign_detected, is_recording = sign_recorder.process_results(results)
+            result, is_recording = sign_recorder.process_results(results)
+
+            # Show the spotted sign, or the predicted one once the worker is done
+            if not args.spot:
+                result = sign_recorder.take_result()
+            if result:
+                sign_detected = result
 
             # Update the frame (draw landmarks & display result)
             webcam_manager.update(frame, results, sign_detected, is_recording)
@@ -61,11 +89,15 @@ if __name__ == "__main__":
             pressedKey = cv2.waitKey(1) & 0xFF
             if pressedKey == ord("r"):  # Record pressing r
                 print("Recording toggled!")
-                sign_recorder.record()
+                # Ignored while the previous recording is being classified
+                if sign_recorder.record():
+                    sign_detected = ""
             elif pressedKey == ord("q"):  # Break pressing q
                 print("Quitting...")
                 break
 
         cap.release()
         cv2.destroyAllWindows()
+        if not args.spot:
+            sign_recorder.executor.shutdown()
         print("Program ended successfully")
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Move the landmarks of the old data/dataset layout (pose_, lh_ and rh_ pickles per
+clip) into the consolidated LandmarkStore under data/landmarks.
+
+Clips already in the store are skipped, so the script can be run again after new
+pickles were added. load_dataset migrates automatically when the store is empty.
+
+With --compact, the frames left in the store by the videos extracted again are
+reclaimed (load_dataset also does it once they are more than a quarter of the store).
+
+    python migrate_landmarks.py [--dataset data/dataset] [--store data/landmarks] [--compact]
+"""
+import argparse
+import os
+
+from utils.dataset_manifest import DatasetManifest
+from utils.landmark_store import DATASET_FOLDER, LANDMARK_STORE_FOLDER, LandmarkStore
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default=DATASET_FOLDER)
+    parser.add_argument("--store", default=LANDMARK_STORE_FOLDER)
+    parser.add_argument("--compact", action="store_true")
+    args = parser.parse_args()
+
+    store = LandmarkStore(args.store)
+    n = store.migrate(args.dataset)
+    if args.compact:
+        n_orphaned = store.compact()
+        manifest_path = os.path.join(args.store, "manifest.json")
+        if os.path.exists(manifest_path):
+            manifest = DatasetManifest(manifest_path)
+            manifest.relocate(store)
+            manifest.save()
+        print(f"{n_orphaned} orphaned frames reclaimed")
+    print(f"{n} clips added, {len(store)} clips and {store.n_frames} frames in {args.store}")
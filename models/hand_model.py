@@ -4,6 +4,64 @@ import numpy as np
 import mediapipe as mp
 
 
+# Ids of the two landmarks of each hand connection, shape (nb_connections, 2)
+CONNECTION_IDS = np.array(list(mp.solutions.holistic.HAND_CONNECTIONS))
+
+
+def get_n_features(compact: bool = False) -> int:
+    """
+    Return
+        Number of features per frame of the hand embeddings, nb_connections ** 2
+        or the size of the strict upper triangle if compact
+    """
+    n = len(CONNECTION_IDS)
+    return n * (n - 1) // 2 if compact else n * n
+
+
+def get_angle_matrices(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Batched version of HandModel._get_feature_vector
+
+    Params
+        landmarks: numpy array of shape (n_frames, 21, 3)
+    Return
+        Array of shape (n_frames, nb_connections, nb_connections) containing
+        the angles between all the connections of each frame.
+        NaN angles and angles between identical vectors are set to 0
+    """
+    connections = CONNECTION_IDS
+    landmarks = np.asarray(landmarks, dtype=np.float64).reshape((-1, 21, 3))
+
+    # Vectors representing the hand connections: (n_frames, nb_connections, 3)
+    vectors = landmarks[:, connections[:, 1]] - landmarks[:, connections[:, 0]]
+
+    dot_products = np.matmul(vectors, vectors.transpose(0, 2, 1))
+    norms = np.linalg.norm(vectors, axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        angles = np.arccos(dot_products / (norms[:, :, None] * norms[:, None, :]))
+
+    # Same conventions as the per-frame path: identical vectors -> 0, NaN -> 0
+    identical = np.all(vectors[:, :, None, :] == vectors[:, None, :, :], axis=3)
+    angles[identical] = 0
+    angles[np.isnan(angles)] = 0
+    return angles
+
+
+def get_upper_triangle(angles: np.ndarray) -> np.ndarray:
+    """
+    The angle matrix is symmetric with a null diagonal, so its strict upper
+    triangle holds all the information. Distances computed on it are those of
+    the full matrix divided by 2 (L1) or by sqrt(2) (Euclidean)
+
+    Params
+        angles: numpy array of shape (n_frames, nb_connections, nb_connections)
+    Return
+        Array of shape (n_frames, nb_connections * (nb_connections - 1) / 2)
+    """
+    rows, cols = np.triu_indices(angles.shape[1], k=1)
+    return angles[:, rows, cols]
+
+
 class HandModel(object):
     """
     Params
@@ -13,10 +71,12 @@ class HandModel(object):
         feature_vector: List of length 21 * 21 = 441 containing the angles between all connections
     """
 
-    def __init__(self, landmarks: List[float]):
+    # Shared by all instances
+    connections = mp.solutions.holistic.HAND_CONNECTIONS
+
+    __slots__ = ("feature_vector",)
 
-        # Define the connections
-        self.connections = mp.solutions.holistic.HAND_CONNECTIONS
+    def __init__(self, landmarks: List[float]):
 
         # Create feature vector (list of the angles between all the connections)
         landmarks = np.array(landmarks).reshape((21, 3))
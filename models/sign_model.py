@@ -1,43 +1,122 @@
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 
-from models.hand_model import HandModel
+from models.hand_model import get_angle_matrices, get_upper_triangle
+
+
+# Version of the embedding computation, to bump whenever it changes the embeddings
+# so the cached ones (see utils.embedding_cache) are recomputed
+FEATURE_VERSION = 1
 
 
 class SignModel(object):
+    __slots__ = (
+        "has_left_hand",
+        "has_right_hand",
+        "n_lh_frames",
+        "n_rh_frames",
+        "lh_embedding",
+        "rh_embedding",
+        "compact",
+    )
+
     def __init__(
-        self, left_hand_list: List[List[float]], right_hand_list: List[List[float]]
+        self,
+        left_hand_list: List[List[float]],
+        right_hand_list: List[List[float]],
+        compact: bool = False,
     ):
         """
         Params
             x_hand_list: List of all landmarks for each frame of a video
+            compact: bool; if True only the strict upper triangle of the angle
+                     matrix is kept (210 features per frame instead of 441)
         Args
             has_x_hand: bool; True if x hand is detected in the video, otherwise False
-            xh_embedding: ndarray; Array of shape (n_frame, nb_connections * nb_connections)
+            n_xh_frames: int; Number of frames of the x hand embedding
+            xh_embedding: ndarray; C-contiguous float32 array of shape
+                          (n_frame, nb_connections * nb_connections)
+        """
+        self.has_left_hand = bool(np.sum(left_hand_list) != 0)
+        self.has_right_hand = bool(np.sum(right_hand_list) != 0)
+
+        self.compact = compact
+
+        self.lh_embedding = self._get_embedding_from_landmark_list(
+            left_hand_list, compact
+        )
+        self.rh_embedding = self._get_embedding_from_landmark_list(
+            right_hand_list, compact
+        )
+        self.n_lh_frames = len(self.lh_embedding)
+        self.n_rh_frames = len(self.rh_embedding)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Return
+            Dictionary of numpy arrays holding the whole state of the SignModel,
+            suitable for np.savez
+        """
+        return {
+            "has_hands": np.array([self.has_left_hand, self.has_right_hand]),
+            "compact": np.array(self.compact),
+            "lh_embedding": self.lh_embedding,
+            "rh_embedding": self.rh_embedding,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "SignModel":
+        """
+        Params
+            arrays: Dictionary returned by to_arrays (or the NpzFile loaded from it)
+        Return
+            The SignModel, without recomputing the embeddings
         """
-        self.has_left_hand = np.sum(left_hand_list) != 0
-        self.has_right_hand = np.sum(right_hand_list) != 0
+        sign_model = cls.__new__(cls)
+        sign_model.has_left_hand = bool(arrays["has_hands"][0])
+        sign_model.has_right_hand = bool(arrays["has_hands"][1])
+        sign_model.compact = bool(arrays["compact"])
+        sign_model.lh_embedding = np.ascontiguousarray(
+            arrays["lh_embedding"], dtype=np.float32
+        )
+        sign_model.rh_embedding = np.ascontiguousarray(
+            arrays["rh_embedding"], dtype=np.float32
+        )
+        sign_model.n_lh_frames = len(sign_model.lh_embedding)
+        sign_model.n_rh_frames = len(sign_model.rh_embedding)
+        return sign_model
 
-        self.lh_embedding = self._get_embedding_from_landmark_list(left_hand_list)
-        self.rh_embedding = self._get_embedding_from_landmark_list(right_hand_list)
+    def save(self, path: str):
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> "SignModel":
+        with np.load(path) as arrays:
+            return cls.from_arrays(arrays)
 
     @staticmethod
     def _get_embedding_from_landmark_list(
-        hand_list: List[List[float]],
-    ) -> List[List[float]]:
+        hand_list: List[List[float]], compact: bool = False
+    ) -> np.ndarray:
         """
         Params
             hand_list: List of all landmarks for each frame of a video
+            compact: bool; keep only the strict upper triangle of the angle matrix
         Return
-            Array of shape (n_frame, nb_connections * nb_connections) containing
-            the feature_vectors of the hand for each frame
+            C-contiguous float32 array of shape (n_frame, nb_connections * nb_connections)
+            containing the feature_vectors of the hand for each frame
+            (n_frame, nb_connections * (nb_connections - 1) / 2) if compact
         """
-        embedding = []
-        for frame_idx in range(len(hand_list)):
-            if np.sum(hand_list[frame_idx]) == 0:
-                continue
+        hand_array = np.asarray(hand_list, dtype=np.float64).reshape((-1, 21 * 3))
+
+        # Frames where the hand is not detected are skipped
+        hand_array = hand_array[np.sum(hand_array, axis=1) != 0]
 
-            hand_gesture = HandModel(hand_list[frame_idx])
-            embedding.append(hand_gesture.feature_vector)
-        return embedding
+        angles = get_angle_matrices(hand_array.reshape((-1, 21, 3)))
+        if compact:
+            embedding = get_upper_triangle(angles)
+        else:
+            # Explicit shape, -1 cannot be inferred for a hand never detected (0 frames)
+            embedding = angles.reshape((len(angles), angles.shape[1] * angles.shape[2]))
+        return np.ascontiguousarray(embedding, dtype=np.float32)
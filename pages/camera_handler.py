@@ -1,79 +1,64 @@
 import cv2
 import mediapipe
-import threading
-import time
 from tkinter import messagebox
 from PIL import Image, ImageTk
-from utils.mediapipe_utils import mediapipe_detection
 
 class CameraHandler:
-    def __init__(self, parent):
+    """
+    Suscriptor de una página al CameraService compartido: dibuja los landmarks,
+    pasa los resultados al reconocimiento y muestra el fotograma
+    """
+
+    def __init__(self, parent, camera_service):
         self.parent = parent
-        
-        # Variables de la cámara
-        self.cap = None
-        self.camera_thread = None
+
+        # Servicio de cámara y Holistic iniciado por MainApp
+        self.camera_service = camera_service
         self.camera_running = False
-        self.current_frame = None
-        
+
         # Estado de grabación para el indicador visual
         self.is_recording_visual = False
     
     def iniciar_camara(self):
-        """Inicializar la cámara"""
-        try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                raise Exception("No se pudo abrir la cámara")
+        """Suscribirse a los fotogramas de la cámara, reabriéndola si falló"""
+        if not self.camera_service.running:
+            self.camera_service.start()
+        if not self.camera_service.running:
+            messagebox.showerror(
+                "Error",
+                f"No se pudo inicializar la cámara: {self.camera_service.error}",
+            )
+            return
+
+        self.camera_running = True
+        self.camera_service.subscribe(self.procesar_frame)
+    
+    def procesar_frame(self, image, results):
+        """Procesar un fotograma del servicio de cámara (hilo del servicio)"""
+        # Copia propia, el fotograma es compartido entre los suscriptores
+        image = image.copy()
+
+        # Procesar resultados del reconocimiento
+        if (self.parent.game_logic.sign_recorder and 
+            self.parent.game_logic.game_active):
             
-            self.camera_running = True
-            self.camera_thread = threading.Thread(target=self.proceso_camara, daemon=True)
-            self.camera_thread.start()
+            sign_detected, is_recording = self.parent.game_logic.sign_recorder.process_results(results)
             
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo inicializar la cámara: {e}")
-    
-    def proceso_camara(self):
-        """Proceso principal de la cámara con reconocimiento"""
-        with mediapipe.solutions.holistic.Holistic(
-            min_detection_confidence=0.5, min_tracking_confidence=0.5
-        ) as holistic:
+            # Actualizar estado de grabación visual
+            self.is_recording_visual = is_recording
             
-            while self.camera_running and self.cap and self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if not ret:
-                    break
-                
-                try:
-                    # Procesar frame con MediaPipe
-                    image, results = mediapipe_detection(frame, holistic)
-                    
-                    # Procesar resultados del reconocimiento
-                    if (self.parent.game_logic.sign_recorder and 
-                        self.parent.game_logic.game_active):
-                        
-                        sign_detected, is_recording = self.parent.game_logic.sign_recorder.process_results(results)
-                        
-                        # Actualizar estado de grabación visual
-                        self.is_recording_visual = is_recording
-                        
-                        # Procesar detección de seña
-                        if sign_detected:
-                            self.parent.game_logic.procesar_deteccion_sena(sign_detected)
-                    
-                    # Dibujar landmarks
-                    self.dibujar_landmarks(image, results)
-                    
-                    # Dibujar indicador de grabación
-                    self.dibujar_indicador_grabacion(image)
-                    
-                    # Convertir y mostrar frame
-                    self.mostrar_frame(image)
-                    
-                except Exception as e:
-                    print(f"Error en proceso de cámara: {e}")
-                
-                time.sleep(0.03)  # ~30 FPS
+            # Procesar detección de seña
+            if sign_detected:
+                self.parent.game_logic.procesar_deteccion_sena(sign_detected)
+        
+        # Dibujar landmarks
+        self.dibujar_landmarks(image, results)
+        
+        # Dibujar indicador de grabación
+        self.dibujar_indicador_grabacion(image)
+        
+        # Convertir y mostrar frame
+        self.mostrar_frame(image)
     
     def dibujar_landmarks(self, image, results):
         """Dibujar landmarks de MediaPipe"""
@@ -139,14 +124,10 @@ class CameraHandler:
             print(f"Error al mostrar frame: {e}")
     
     def detener_camara(self):
-        """Detener la cámara"""
+        """Dejar de recibir fotogramas, la cámara sigue abierta en el servicio"""
         self.camera_running = False
-        if self.cap:
-            self.cap.release()
-            self.cap = None
-        
-        # Solo hacer join si no estamos en el mismo hilo
-        if self.camera_thread and self.camera_thread != threading.current_thread():
-            self.camera_thread.join(timeout=1.0)
-        
-        self.camera_thread = None
\ No newline at end of file
+        self.camera_service.unsubscribe(self.procesar_frame)
+
+        # Sin fotogramas la grabación en curso no terminaría nunca
+        if self.parent.game_logic.sign_recorder:
+            self.parent.game_logic.sign_recorder.cancel()
@@ -0,0 +1,205 @@
+import threading
+import time
+
+import cv2
+import mediapipe
+
+from utils.mediapipe_utils import mediapipe_detection
+
+
+class LatestFrame:
+    """
+    Búfer de una sola posición entre la captura y la inferencia: cada fotograma
+    capturado reemplaza al anterior, y los que nadie llegó a procesar se cuentan
+    como descartados. Así la inferencia siempre toma el fotograma más reciente y
+    nunca procesa una cola de fotogramas viejos
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._timestamp = None
+        self.closed = False
+
+        # Fotogramas reemplazados antes de ser procesados
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._timestamp = time.monotonic()
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        :return: el fotograma más reciente y su hora de captura (time.monotonic),
+                 (None, None) si no llegó ninguno antes de timeout o si se cerró
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._frame is not None or self.closed, timeout
+            )
+            frame, timestamp = self._frame, self._timestamp
+            self._frame = self._timestamp = None
+            return frame, timestamp
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class CameraService:
+    """
+    Cámara y modelo Holistic compartidos por toda la aplicación.
+
+    MainApp lo inicia una sola vez; las páginas se suscriben al empezar un juego y
+    se desuscriben al salir, sin volver a abrir la cámara ni cargar el modelo.
+    Cada suscriptor recibe (image, results) desde el hilo de inferencia.
+
+    Un hilo captura sin pausa y deja cada fotograma en un LatestFrame; el hilo de
+    inferencia toma siempre el último, así la latencia queda acotada por una captura
+    más una inferencia aunque Holistic sea más lento que la cámara
+    """
+
+    def __init__(self, camera_index=0):
+        self.camera_index = camera_index
+
+        self.cap = None
+        self.holistic = None
+        self.capture_thread = None
+        self.thread = None
+        self.running = False
+        self.error = None
+        self.frames = LatestFrame()
+
+        # Retraso entre la captura y la entrega del último fotograma procesado
+        self.latency = 0.0
+
+        # Suscriptores y evento para despertar el hilo cuando llega el primero
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    @property
+    def dropped_frames(self):
+        """Número de fotogramas capturados que la inferencia no alcanzó a procesar"""
+        return self.frames.dropped
+
+    def start(self):
+        """
+        Abrir la cámara, cargar Holistic y lanzar los hilos de captura e inferencia.
+        También reabre la cámara tras un error de lectura
+        """
+        if self.running:
+            return
+        # Hilos terminados y cámara fallida de un inicio anterior
+        self.stop()
+        try:
+            self.cap = cv2.VideoCapture(self.camera_index)
+            if not self.cap.isOpened():
+                raise Exception("No se pudo abrir la cámara")
+            self.holistic = mediapipe.solutions.holistic.Holistic(
+                min_detection_confidence=0.5, min_tracking_confidence=0.5
+            )
+        except Exception as e:
+            self.error = e
+            print(f"Error al iniciar el servicio de cámara: {e}")
+            self._release()
+            return
+
+        self.error = None
+        self.running = True
+        self.frames = LatestFrame()
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.capture_thread.start()
+        self.thread.start()
+
+    def subscribe(self, callback):
+        """
+        :param callback: función callback(image, results) llamada en cada fotograma
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        self._wakeup.set()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def stop(self):
+        """Detener los hilos y liberar la cámara y el modelo"""
+        self.running = False
+        self._wakeup.set()
+        self.frames.close()
+        for thread in (self.capture_thread, self.thread):
+            if thread and thread != threading.current_thread():
+                thread.join(timeout=1.0)
+        self.capture_thread = self.thread = None
+        self._release()
+
+    def _release(self):
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        if self.holistic:
+            self.holistic.close()
+            self.holistic = None
+
+    def _has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def _capture_loop(self):
+        """
+        Hilo de captura: vacía el búfer del driver sin pausa para que el último
+        fotograma sea siempre reciente. Sin suscriptores solo hace grab() (sin
+        decodificar)
+        """
+        while self.running:
+            if not self._has_subscribers():
+                ret = self.cap.grab()
+                frame = None
+            else:
+                ret, frame = self.cap.read()
+            if not ret:
+                self.error = Exception("No se pudo leer el fotograma de la cámara")
+                print(f"Error en el servicio de cámara: {self.error}")
+                self.running = False
+                self.frames.close()
+                break
+            if frame is not None:
+                self.frames.put(frame)
+
+    def _loop(self):
+        """Hilo de inferencia: procesa el último fotograma si hay suscriptores"""
+        while self.running:
+            if not self._has_subscribers():
+                self._wakeup.clear()
+                self._wakeup.wait(timeout=0.5)
+                continue
+
+            frame, timestamp = self.frames.get(timeout=0.5)
+            if frame is None:
+                continue
+
+            try:
+                # Procesar frame con MediaPipe, una sola vez para todos
+                image, results = mediapipe_detection(frame, self.holistic)
+            except Exception as e:
+                print(f"Error en el servicio de cámara: {e}")
+                continue
+
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(image, results)
+                except Exception as e:
+                    print(f"Error en suscriptor de cámara: {e}")
+            self.latency = time.monotonic() - timestamp
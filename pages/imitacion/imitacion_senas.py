@@ -1,7 +1,7 @@
 import customtkinter as ctk
 from pages.imitacion.ui_components import ImitacionUI
 from pages.imitacion.game_logic import GameLogic
-from pages.imitacion.camera_handler import CameraHandler
+from pages.camera_handler import CameraHandler
 
 class ImitacionSeñasGame(ctk.CTkFrame):
     def __init__(self, parent, controller):
@@ -12,7 +12,7 @@ class ImitacionSeñasGame(ctk.CTkFrame):
         # Inicializar componentes
         self.ui = ImitacionUI(self)
         self.game_logic = GameLogic(self)
-        self.camera_handler = CameraHandler(self)
+        self.camera_handler = CameraHandler(self, controller.camera_service)
         
         # Configurar UI
         self.ui.setup_ui()
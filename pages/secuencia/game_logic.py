@@ -1,11 +1,16 @@
 import random
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
 from utils.dataset_utils import load_dataset, load_reference_signs
-from sign_recorder import SignRecorder
+from sign_recorder import SignRecorder, make_matcher
 
 class GameLogic:
-    def __init__(self, parent):
+    def __init__(self, parent, matcher="fastdtw"):
         self.parent = parent
+
+        # Comparador de las grabaciones (ver sign_recorder.MATCHERS), "exact" es
+        # opcional porque cambia el orden de las señas más cercanas
+        self.matcher = matcher
         
         # Variables del juego
         self.secuencia_actual = []
@@ -54,7 +59,14 @@ class GameLogic:
         try:
             videos = load_dataset()
             self.reference_signs = load_reference_signs(videos)
-            self.sign_recorder = SignRecorder(self.reference_signs)
+            # Las grabaciones se clasifican en un hilo aparte para no congelar la
+            # cámara. fastdtw no libera el GIL y resta fotogramas a la cámara
+            # mientras clasifica, "exact" (numpy) sí lo libera
+            self.sign_recorder = SignRecorder(
+                self.reference_signs,
+                matcher=make_matcher(self.matcher, self.reference_signs),
+                executor=ThreadPoolExecutor(max_workers=1),
+            )
             print("Sistema de reconocimiento inicializado correctamente")
         except Exception as e:
             print(f"Error al inicializar reconocimiento: {e}")
@@ -160,19 +172,28 @@ class GameLogic:
         if not self.sign_recorder or not self.game_active:
             return
 
+        # Ignorado mientras se clasifica la grabación anterior
+        if not self.sign_recorder.record():
+            return
+
         # Actualizar UI y indicador visual en la cámara
         self.parent.ui.actualizar_estado_grabacion(True)
         self.parent.camera_handler.set_recording_state(True)
-        self.sign_recorder.record()
 
-        # Restaurar estado después de 1 segundo
-        self.parent.after(1000, lambda: self._restaurar_estado_grabacion())
+        # Restaurar estado al recibir la seña predicha (hilo principal)
+        self.sign_recorder.poll(self.parent.after, self._recibir_resultado)
     
     def _restaurar_estado_grabacion(self):
         """Restaurar estado de grabación en UI y cámara"""
         self.parent.ui.actualizar_estado_grabacion(False)
         self.parent.camera_handler.set_recording_state(False)
-    
+
+    def _recibir_resultado(self, sign_detected):
+        """Seña predicha de la grabación, en el hilo principal (ver SignRecorder.poll)"""
+        self._restaurar_estado_grabacion()
+        if sign_detected:
+            self.procesar_deteccion_sena(sign_detected)
+
     def iniciar_temporizador(self):
         """Iniciar temporizador del juego"""
         # Más tiempo para oraciones complejas
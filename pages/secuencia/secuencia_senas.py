@@ -1,7 +1,7 @@
 import customtkinter as ctk
 from pages.secuencia.ui_components import SecuenciaUI
 from pages.secuencia.game_logic import GameLogic
-from pages.secuencia.camera_handler import CameraHandler
+from pages.camera_handler import CameraHandler
 
 class SecuenciaSeñasGame(ctk.CTkFrame):
     def __init__(self, parent, controller):
@@ -12,7 +12,7 @@ class SecuenciaSeñasGame(ctk.CTkFrame):
         # Inicializar componentes
         self.ui = SecuenciaUI(self)
         self.game_logic = GameLogic(self)
-        self.camera_handler = CameraHandler(self)
+        self.camera_handler = CameraHandler(self, controller.camera_service)
         
         # Configurar UI
         self.ui.setup_ui()
@@ -1,30 +1,132 @@
-import pandas as pd
+import time
+from functools import partial
+
 import numpy as np
 from collections import Counter
 
-from utils.dtw import dtw_distances
+from utils.dtw import BatchDTWMatcher, dtw_distances
 from models.sign_model import SignModel
-from utils.landmark_utils import extract_landmarks
+from utils.landmark_store import HAND_CHANNELS
+from utils.landmark_utils import extract_channels
+from utils.reference_index import ReferenceIndex
+from utils.signature_index import SignatureMatcher
+
+
+# Comparadores disponibles para make_matcher
+MATCHERS = ("fastdtw", "exact", "signature")
+
+
+def make_matcher(name, reference_signs: ReferenceIndex):
+    """
+    Construye el comparador de las grabaciones con las señas de referencia
+
+    :param name: "fastdtw" (dtw_distances, aproximado, el de siempre), "exact"
+                 (BatchDTWMatcher, DTW exacto sin restricción: cambia el orden de
+                 las señas más cercanas, pero libera el GIL mientras calcula) o
+                 "signature" (SignatureMatcher, fastdtw solo sobre las señas de
+                 firma más parecida)
+    :return: función matcher(seña_grabada) -> ReferenceIndex con las distancias
+    """
+    if name == "fastdtw":
+        return partial(dtw_distances, reference_signs=reference_signs)
+    if name == "exact":
+        return BatchDTWMatcher(reference_signs)
+    if name == "signature":
+        return SignatureMatcher(reference_signs)
+    raise ValueError(f"Comparador desconocido: {name}")
 
 
 class SignRecorder(object):
-    def __init__(self, reference_signs: pd.DataFrame, seq_len=50):
+    def __init__(
+        self,
+        reference_signs: ReferenceIndex,
+        seq_len=50,
+        compact=False,
+        matcher=None,
+        target_fps=None,
+        executor=None,
+    ):
         # Variables para la grabación
         self.is_recording = False
         self.seq_len = seq_len
 
-        # Lista para almacenar los resultados de cada fotograma
+        # Si no es None, solo se graban fotogramas a esta frecuencia como máximo,
+        # la misma que la usada al extraer las señas de referencia (load_dataset)
+        self.target_fps = target_fps
+        self._next_frame_time = 0.0
+
+        # Formato de los embeddings, debe coincidir con el de load_reference_signs
+        self.compact = compact
+
+        # Lista para almacenar los puntos de referencia de cada fotograma,
+        # solo se convierten las manos (las señas no usan la pose)
         self.recorded_results = []
 
-        # DataFrame que almacena las distancias entre la seña grabada y las señas de referencia del dataset
+        # Índice que almacena las distancias entre la seña grabada y las señas de referencia del dataset
         self.reference_signs = reference_signs
 
-    def record(self):
+        # Objeto que calcula las distancias de una seña grabada a todas las señas
+        # de referencia (p. ej. BatchDTWMatcher), si es None se usa dtw_distances
+        self.matcher = matcher
+
+        # Si no es None (p. ej. ThreadPoolExecutor(1)), las grabaciones terminadas se
+        # clasifican en él sin bloquear el bucle de la cámara, y pending guarda el
+        # Future de la última, cuyo resultado es la palabra predicha
+        self.executor = executor
+        self.pending = None
+
+    def record(self) -> bool:
         """
-        Inicializa las distancias y comienza la grabación
+        Inicializa las distancias y comienza la grabación,
+        salvo si todavía se está clasificando la grabación anterior
+
+        :return: True si la grabación comenzó
         """
-        self.reference_signs["distance"].values[:] = 0
+        if self.pending is not None and not self.pending.done():
+            return False
+        self.reference_signs.reset_distances()
         self.is_recording = True
+        return True
+
+    def cancel(self):
+        """
+        Descarta la grabación en curso, p. ej. al detener la cámara
+        """
+        self.recorded_results = []
+        self.is_recording = False
+
+    def take_result(self):
+        """
+        Recoge sin bloquear la palabra predicha de la última grabación enviada al
+        executor, una sola vez
+
+        :return: None si no hay clasificación terminada por recoger, la palabra
+                 predicha, o texto vacío si la clasificación falló
+        """
+        if self.pending is None or not self.pending.done():
+            return None
+        future, self.pending = self.pending, None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error al clasificar la seña: {e}")
+            return ""
+
+    def poll(self, after, on_result, interval=50):
+        """
+        Espera sin bloquear a que termine la grabación en curso y su clasificación,
+        consultando cada interval ms con after (p. ej. el método after de Tk, así
+        on_result se llama en el hilo principal)
+
+        :param on_result: función on_result(palabra) llamada una sola vez, con texto
+                          vacío si la grabación se canceló o la clasificación falló
+        """
+        if self.is_recording or (self.pending is not None and not self.pending.done()):
+            after(interval, lambda: self.poll(after, on_result, interval))
+            return
+
+        sign_detected = self.take_result()
+        on_result(sign_detected or "")
 
     def process_results(self, results) -> (str, bool):  # type: ignore
         """
@@ -32,41 +134,98 @@ class SignRecorder(object):
             almacena los puntos de referencia durante seq_len fotogramas
             y luego calcula las distancias con las señas de referencia
 
+        Con un executor, la grabación terminada se clasifica en él (ver pending)
+        y la palabra predicha nunca se devuelve aquí
+
         :param results: salida de mediapipe
         :return: Devuelve la palabra predicha (texto vacío si no se han calculado distancias)
                  y el estado de grabación
         """
         if self.is_recording:
             if len(self.recorded_results) < self.seq_len:
-                self.recorded_results.append(results)
+                if self._keep_frame():
+                    self.recorded_results.append(
+                        extract_channels(results, HAND_CHANNELS)
+                    )
+            elif self.executor is not None:
+                self.classify_async()
             else:
                 self.compute_distances()
-                print(self.reference_signs)
-
-        if np.sum(self.reference_signs["distance"].values) == 0:
+                nearest = self.reference_signs.top_k(5)
+                print(
+                    list(
+                        zip(
+                            self.reference_signs.names[nearest],
+                            self.reference_signs.distances[nearest],
+                        )
+                    )
+                )
+
+        if self.executor is not None or np.sum(self.reference_signs.distances) == 0:
             return "", self.is_recording
         return self._get_sign_predicted(), self.is_recording
 
-    def compute_distances(self):
+    def _keep_frame(self) -> bool:
+        """
+        Limita la frecuencia de los fotogramas grabados a target_fps
         """
-        Actualiza la columna de distancias del DataFrame reference_signs
+        if self.target_fps is None:
+            return True
+        now = time.monotonic()
+        if now < self._next_frame_time:
+            return False
+        self._next_frame_time = max(self._next_frame_time + 1 / self.target_fps, now)
+        return True
+
+    def classify_async(self):
+        """
+        Envía la grabación al executor y reinicia las variables de grabación,
+        el bucle de la cámara sigue mientras se calculan las distancias
+
+        :return: Future de la palabra predicha, también guardado en pending
+        """
+        recorded_results = self.recorded_results
+        self.recorded_results = []
+        # pending se asigna antes de terminar la grabación, así quien vea
+        # is_recording en False ya encuentra el Future
+        self.pending = self.executor.submit(self._classify, recorded_results)
+        self.is_recording = False
+        return self.pending
+
+    def _classify(self, recorded_results):
+        """
+        Calcula las distancias de una grabación (hilo del executor)
+
+        :return: El nombre de la seña predicha
+        """
+        self.compute_distances(recorded_results)
+        return self._get_sign_predicted()
+
+    def compute_distances(self, recorded_results=None):
+        """
+        Actualiza las distancias del índice reference_signs
         y reinicia las variables de grabación
+
+        :param recorded_results: grabación a comparar, la actual si es None
         """
-        left_hand_list, right_hand_list = [], []
-        for results in self.recorded_results:
-            _, left_hand, right_hand = extract_landmarks(results)
-            left_hand_list.append(left_hand)
-            right_hand_list.append(right_hand)
+        if recorded_results is None:
+            recorded_results = self.recorded_results
+        left_hand_list = [landmarks["left_hand"] for landmarks in recorded_results]
+        right_hand_list = [landmarks["right_hand"] for landmarks in recorded_results]
 
         # Crear un objeto SignModel con los puntos recolectados durante la grabación
-        recorded_sign = SignModel(left_hand_list, right_hand_list)
+        recorded_sign = SignModel(left_hand_list, right_hand_list, self.compact)
 
-        # Calcular la similitud con otras señas usando DTW (orden ascendente)
-        self.reference_signs = dtw_distances(recorded_sign, self.reference_signs)
+        # Calcular la similitud con otras señas usando DTW
+        if self.matcher is None:
+            self.reference_signs = dtw_distances(recorded_sign, self.reference_signs)
+        else:
+            self.reference_signs = self.matcher(recorded_sign)
 
-        # Reiniciar variables
-        self.recorded_results = []
-        self.is_recording = False
+        # Reiniciar variables (ya reiniciadas por classify_async)
+        if recorded_results is self.recorded_results:
+            self.recorded_results = []
+            self.is_recording = False
 
     def _get_sign_predicted(self, batch_size=5, threshold=0.2):
         """
@@ -80,7 +239,8 @@ class SignRecorder(object):
         :return: El nombre de la seña predicha
         """
         # Obtener la lista (de tamaño batch_size) de las señas más similares
-        sign_names = self.reference_signs.iloc[:batch_size]["name"].values
+        nearest = self.reference_signs.top_k(batch_size)
+        sign_names = self.reference_signs.names[nearest]
 
         # Contar las ocurrencias de cada seña y ordenarlas de forma descendente
         sign_counter = Counter(sign_names).most_common()
@@ -0,0 +1,184 @@
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.landmark_store import HAND_CHANNELS
+from utils.landmark_utils import extract_channels
+from utils.reference_index import ReferenceIndex
+from utils.streaming_dtw import SubsequenceDTW
+
+
+class _HandSpotter(object):
+    """
+    DTW de subsecuencias de una mano contra las señas de referencia que la usan,
+    con un estado por partición del ReferenceIndex
+    """
+
+    def __init__(self, reference_signs: ReferenceIndex, hand: str, max_gap: int):
+        """
+        :param hand: "lh" o "rh"
+        :param max_gap: ver SignSpotter
+        """
+        self.max_gap = max_gap
+        self.dtws = []
+        for key, (positions, store) in reference_signs.all_partitions().items():
+            has_left_hand, has_right_hand, _ = key
+            if (has_left_hand, has_right_hand)[hand == "rh"]:
+                embeddings = getattr(store, f"{hand}_embeddings")
+                lengths = getattr(store, f"{hand}_lengths")
+                self.dtws.append((positions, SubsequenceDTW(embeddings, lengths)))
+
+        # Costo de la mejor alineación de cada seña de referencia, fotograma del
+        # flujo donde empieza y último fotograma en que se vio la mano (donde termina)
+        self.costs = np.full(len(reference_signs), np.inf)
+        self.starts = np.zeros(len(reference_signs), dtype=np.int64)
+        self.end = 0
+        self.gap = 0
+
+    def reset(self):
+        for _, dtw in self.dtws:
+            dtw.reset()
+        self.costs[:] = np.inf
+
+    def update(self, embedding: np.ndarray, position: int):
+        """
+        :param embedding: embedding de la mano en el fotograma, vacío si no se vio
+        :param position: posición del fotograma en el flujo
+        """
+        if len(embedding) == 0:
+            self.gap += 1
+            if self.gap == self.max_gap:
+                self.reset()
+            return
+
+        self.gap = 0
+        self.end = position
+        for positions, dtw in self.dtws:
+            self.costs[positions] = dtw.update(embedding[0], position)
+            self.starts[positions] = dtw.alignment_starts
+
+
+class SignSpotter(object):
+    """
+    Reconocimiento continuo, sin grabación: cada fotograma actualiza un DTW de
+    subsecuencias (inicio y fin abiertos) contra todas las señas de referencia y
+    se detecta una seña cuando su costo normalizado baja del umbral
+
+    Los estados del DTW siguen las particiones del ReferenceIndex (manos usadas y
+    longitud, ver ReferenceIndex.partitions): cada mano solo se compara con las
+    señas que la usan, rellenadas hasta la longitud máxima de su partición (menos
+    del doble de la de cada seña) y no hasta la de todo el índice. Por fotograma,
+    el costo de una mano es del orden del número de fotogramas de las señas que la
+    usan por el de características. Con 300 señas de 45 a 90 fotogramas y 441
+    características, ~35 ms por mano si un tercio usa solo la izquierda, un tercio
+    solo la derecha y un tercio ambas (~53 ms si todas usan la mano), contra ~65 ms
+    por mano con el relleno global y todas las señas
+
+    Tiene la misma interfaz que SignRecorder (record y process_results)
+    """
+
+    def __init__(
+        self,
+        reference_signs: ReferenceIndex,
+        threshold=0.15,
+        compact=False,
+        max_gap=15,
+        max_offset=3,
+        on_detection=None,
+    ):
+        """
+        :param reference_signs: ReferenceIndex de las señas de referencia
+        :param threshold: umbral del costo normalizado, es decir la diferencia media
+                          de ángulo (en radianes) por característica y por fotograma
+                          de la seña de referencia
+        :param compact: formato de los embeddings, debe coincidir con el de
+                        load_reference_signs
+        :param max_gap: número de fotogramas sin una mano tras el cual se olvida
+                        el estado de esa mano
+        :param max_offset: en las señas de dos manos, diferencia máxima (en
+                           fotogramas) entre los inicios y entre los fines de las
+                           alineaciones de cada mano, que deben cubrir la misma
+                           ventana del flujo (cada mano omite los fotogramas en que
+                           no se detecta, así que no coinciden exactamente)
+        :param on_detection: función opcional llamada con (nombre, costo) en cada detección
+        """
+        self.reference_signs = reference_signs
+        self.names = reference_signs.names
+        self.threshold = threshold
+        self.compact = compact
+        self.max_offset = max_offset
+        self.on_detection = on_detection
+
+        self.has_left_hand = reference_signs.has_left_hand
+        self.has_right_hand = reference_signs.has_right_hand
+        self.lh_lengths = np.diff(reference_signs.lh_offsets)
+        self.rh_lengths = np.diff(reference_signs.rh_offsets)
+        self.n_features = max(
+            reference_signs.lh_embeddings.shape[1],
+            reference_signs.rh_embeddings.shape[1],
+        )
+
+        self.left_hand = _HandSpotter(reference_signs, "lh", max_gap)
+        self.right_hand = _HandSpotter(reference_signs, "rh", max_gap)
+
+        # Posición del fotograma actual en el flujo
+        self.position = 0
+
+    def record(self) -> bool:
+        """
+        Reinicia el estado del reconocimiento continuo
+
+        :return: True, como SignRecorder.record
+        """
+        self.left_hand.reset()
+        self.right_hand.reset()
+        return True
+
+    def process_results(self, results) -> (str, bool):  # type: ignore
+        """
+        :param results: salida de mediapipe
+        :return: Devuelve la palabra detectada en este fotograma (texto vacío si no hay)
+                 y True (el reconocimiento continuo siempre está activo)
+        """
+        landmarks = extract_channels(results, HAND_CHANNELS)
+        for hand, channel in zip((self.left_hand, self.right_hand), HAND_CHANNELS):
+            embedding = SignModel._get_embedding_from_landmark_list(
+                [landmarks[channel]], self.compact
+            )
+            hand.update(embedding, self.position)
+        self.position += 1
+
+        scores = self._normalized_costs()
+        best = int(np.argmin(scores))
+        if scores[best] >= self.threshold:
+            return "", True
+
+        sign_detected = self.names[best]
+        if self.on_detection is not None:
+            self.on_detection(sign_detected, scores[best])
+
+        # Se olvida el estado para no detectar la misma seña en los fotogramas siguientes
+        self.record()
+        return sign_detected, True
+
+    def _normalized_costs(self) -> np.ndarray:
+        """
+        Costo de cada seña de referencia dividido por su número de fotogramas y de
+        características, promediado sobre las manos que usa. Las señas de dos manos
+        cuyas alineaciones no cubren la misma ventana del flujo quedan en np.inf
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lh = self.left_hand.costs / (self.lh_lengths * self.n_features)
+            rh = self.right_hand.costs / (self.rh_lengths * self.n_features)
+        n_hands = self.has_left_hand.astype(int) + self.has_right_hand.astype(int)
+
+        scores = np.where(self.has_left_hand, lh, 0) + np.where(
+            self.has_right_hand, rh, 0
+        )
+        scores = scores / np.maximum(n_hands, 1)
+        scores[n_hands == 0] = np.inf
+
+        same_window = (
+            np.abs(self.left_hand.starts - self.right_hand.starts) <= self.max_offset
+        ) & (abs(self.left_hand.end - self.right_hand.end) <= self.max_offset)
+        scores[(n_hands == 2) & ~same_window] = np.inf
+        return scores
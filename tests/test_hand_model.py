@@ -0,0 +1,31 @@
+import numpy as np
+
+from models.hand_model import HandModel, get_angle_matrices, get_n_features
+from models.sign_model import SignModel
+
+
+def test_angle_matrices_match_hand_model():
+    rng = np.random.default_rng(0)
+    landmarks = rng.random((6, 21, 3))
+    # A frame with two identical connections and one with null connections (NaN)
+    landmarks[1, 2] = landmarks[1, 1] + (landmarks[1, 1] - landmarks[1, 0])
+    landmarks[2] = 0
+
+    angles = get_angle_matrices(landmarks)
+
+    expected = np.array([HandModel(frame.reshape(-1)).feature_vector for frame in landmarks])
+    np.testing.assert_allclose(angles.reshape((len(landmarks), -1)), expected, atol=1e-6)
+
+
+def test_zero_frame_hand():
+    assert get_angle_matrices(np.zeros((0, 21, 3))).shape[0] == 0
+
+    left_hand = np.random.default_rng(1).random((4, 63)).tolist()
+    right_hand = np.zeros((4, 63)).tolist()
+    for compact in (False, True):
+        sign_model = SignModel(left_hand, right_hand, compact)
+
+        assert not sign_model.has_right_hand
+        assert sign_model.n_rh_frames == 0
+        assert sign_model.rh_embedding.shape == (0, get_n_features(compact))
+        assert sign_model.lh_embedding.shape == (4, get_n_features(compact))
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from utils.landmark_store import CHANNELS, HAND_CHANNELS, LandmarkStore
+
+
+def _clip(n_frames, value):
+    return {
+        channel: np.full((n_frames, CHANNELS[channel]), value, dtype=np.float32)
+        for channel in HAND_CHANNELS
+    }
+
+
+def test_compact_reclaims_frames_of_clips_extracted_again(tmp_path):
+    folder = str(tmp_path / "landmarks")
+    store = LandmarkStore(folder, HAND_CHANNELS)
+    store.append("hola-1", {**_clip(5, 1), "fps": 30.0})
+    store.append("casa-1", _clip(3, 2))
+    # Extracted again: the first 5 frames are orphaned
+    store.append("hola-1", {**_clip(4, 3), "fps": 15.0})
+    assert store.orphaned_frames == 5
+
+    assert store.compact() == 5
+    assert store.orphaned_frames == 0
+    assert store.n_frames == 7
+    size = os.path.getsize(os.path.join(folder, "left_hand.f32"))
+    assert size == 7 * CHANNELS["left_hand"] * 4
+    assert not os.path.exists(os.path.join(folder, "compact"))
+
+    for reopened in (store, LandmarkStore(folder)):
+        assert reopened.videos == ["hola-1", "casa-1"]
+        assert reopened.fps("hola-1") == 15.0
+        np.testing.assert_array_equal(reopened.get("hola-1")["right_hand"], _clip(4, 3)["right_hand"])
+        np.testing.assert_array_equal(reopened.get("casa-1")["left_hand"], _clip(3, 2)["left_hand"])
+
+    # Nothing to reclaim
+    assert store.compact() == 0
@@ -0,0 +1,35 @@
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.prototypes import build_prototypes, k_medoids
+from utils.reference_index import ReferenceIndex
+
+
+def _clip(seed, n_frames=8):
+    """Left hand only clip of random landmarks"""
+    rng = np.random.default_rng(seed)
+    left_hand = rng.random((n_frames, 63)).tolist()
+    right_hand = np.zeros((n_frames, 63)).tolist()
+    return SignModel(left_hand, right_hand)
+
+
+def test_k_medoids_duplicates():
+    # Four identical points and one distinct point
+    distances = np.zeros((5, 5))
+    distances[4, :4] = distances[:4, 4] = 1.0
+
+    medoids = k_medoids(distances, 4)
+
+    assert len(medoids) == 2
+    assert len(set(medoids.tolist())) == 2
+
+
+def test_build_prototypes_duplicate_clips():
+    clip = _clip(0)
+    reference_signs = ReferenceIndex(["a", "a", "a", "b"], [clip, clip, clip, _clip(1)])
+
+    for method in ("medoid", "dba"):
+        prototypes = build_prototypes(reference_signs, 3, method)
+
+        # One prototype for the duplicated clips of "a", one for "b"
+        assert sorted(prototypes.names.tolist()) == ["a", "b"]
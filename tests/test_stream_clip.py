@@ -0,0 +1,116 @@
+import os
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from utils.dataset_manifest import DatasetManifest
+from utils.dataset_utils import ingest_clip
+from utils.landmark_store import HAND_CHANNELS, LandmarkStore
+from utils.landmark_utils import stream_clip
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+    reason="ffmpeg is not installed",
+)
+
+
+class FakeHolistic(object):
+    """Holistic detecting nothing, records the shape of the frames it receives"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def reset(self):
+        pass
+
+    def process(self, image):
+        self.shapes.append(image.shape)
+        return SimpleNamespace(
+            pose_landmarks=None, left_hand_landmarks=None, right_hand_landmarks=None
+        )
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Two seconds of a 320x240 test pattern at 30 fps"""
+    path = str(tmp_path / "source.mp4")
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+        + ["-f", "lavfi", "-i", "testsrc=size=320x240:rate=30", "-t", "2"]
+        + ["-c:v", "mpeg4", path],
+        check=True,
+    )
+    return path
+
+
+def test_stream_clip_whole_video(source):
+    frames, fps = stream_clip(source)
+    frames = list(frames)
+
+    assert fps == 30
+    assert len(frames) == 60
+    assert frames[0].shape == (240, 320, 3)
+
+
+def test_stream_clip_decimates_and_downscales(source):
+    frames, fps = stream_clip(source, target_fps=10, max_resolution=160)
+    frames = list(frames)
+
+    assert fps == 10
+    assert abs(len(frames) - 20) <= 1
+    assert all(frame.shape == (120, 160, 3) for frame in frames)
+
+    # Never upsampled above the frame rate of the source
+    frames, fps = stream_clip(source, target_fps=60)
+    assert fps == 30
+    assert len(list(frames)) == 60
+
+
+def test_stream_clip_saves_the_clip(source, tmp_path):
+    clip_file = str(tmp_path / "clip.mp4")
+    frames, _ = stream_clip(
+        source, start_time="00:00:00.5", duration_time="00:00:01", clip_file=clip_file
+    )
+
+    assert abs(len(list(frames)) - 30) <= 2
+    assert os.path.getsize(clip_file) > 0
+
+
+def test_stream_clip_ffmpeg_failure(source, tmp_path):
+    # ffmpeg cannot open the clip file in a missing folder
+    clip_file = str(tmp_path / "missing" / "clip.mp4")
+    frames, _ = stream_clip(source, clip_file=clip_file)
+
+    with pytest.raises(RuntimeError, match="ffmpeg failed"):
+        list(frames)
+
+
+def test_ingest_clip(source, tmp_path, monkeypatch):
+    # The clip file is saved under data/videos, relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    store = LandmarkStore(str(tmp_path / "landmarks"), HAND_CHANNELS)
+    manifest = DatasetManifest(str(tmp_path / "manifest.json"))
+    holistic = FakeHolistic()
+
+    ingest_clip(
+        "hola-abc",
+        source,
+        store=store,
+        manifest=manifest,
+        holistic=holistic,
+        target_fps=10,
+        max_resolution=160,
+        keep_clip=True,
+    )
+
+    n_frames = len(holistic.shapes)
+    assert abs(n_frames - 20) <= 1
+    assert set(holistic.shapes) == {(120, 160, 3)}
+    assert store.get("hola-abc")["left_hand"].shape[0] == n_frames
+    assert store.fps("hola-abc") == 10
+
+    clip_file = os.path.join("data", "videos", "hola", "hola-abc.mp4")
+    assert os.path.getsize(clip_file) > 0
+    assert manifest.entries["hola-abc"]["path"] == clip_file
@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils.dtw import batch_dtw
+from utils.streaming_dtw import SubsequenceDTW
+
+
+def window_distances(stream, reference, length):
+    """DTW of the reference with every window of the stream ending at its last frame"""
+    return np.array(
+        [
+            batch_dtw(stream[start:], reference[None], np.array([length]))[0]
+            for start in range(len(stream))
+        ]
+    )
+
+
+def test_subsequence_dtw_matches_best_window():
+    rng = np.random.default_rng(0)
+    references = rng.random((3, 6, 4)).astype(np.float32)
+    lengths = np.array([6, 4, 2])
+    stream = rng.random((15, 4)).astype(np.float32)
+    stream[5:9] = references[1, :4]
+
+    dtw = SubsequenceDTW(references, lengths)
+    for end, frame in enumerate(stream):
+        costs = dtw.update(frame)
+        for idx in range(len(references)):
+            # DTW of every window of the stream ending at this frame
+            windows = window_distances(stream[: end + 1], references[idx], lengths[idx])
+            np.testing.assert_allclose(costs[idx], windows.min(), rtol=1e-6)
+            start = dtw.alignment_starts[idx]
+            np.testing.assert_allclose(windows[start], costs[idx], rtol=1e-6)
+
+    # The inserted reference is found where it was inserted
+    dtw.reset()
+    for frame in stream[:9]:
+        costs = dtw.update(frame)
+    assert costs[1] == 0
+    assert dtw.alignment_starts[1] == 5
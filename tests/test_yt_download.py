@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from yt_download import LocalFetcher, SourceCache, download_videos
+
+
+class CountingFetcher(LocalFetcher):
+    def __init__(self, source_folder):
+        super().__init__(source_folder)
+        self.fetched = []
+
+    def fetch(self, video_id, path):
+        self.fetched.append(video_id)
+        return super().fetch(video_id, path)
+
+
+def _sources(tmp_path, video_ids, size=10):
+    folder = tmp_path / "sources"
+    folder.mkdir()
+    for video_id in video_ids:
+        (folder / f"{video_id}.mp4").write_bytes(video_id.encode() * size)
+    return str(folder)
+
+
+def _set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_source_cache_evicts_least_recently_used(tmp_path):
+    fetcher = LocalFetcher(_sources(tmp_path, ["a", "b", "c"]))
+    folder = str(tmp_path / "cache")
+
+    # The sources of the current run are kept even above max_size
+    cache = SourceCache(fetcher, folder, max_size=25)
+    paths = {video_id: cache.get(video_id) for video_id in "abc"}
+    assert all(os.path.exists(path) for path in paths.values())
+    for mtime, video_id in enumerate("abc"):
+        _set_mtime(paths[video_id], 1000 + mtime)
+
+    # Next run: "a" is a hit, its mtime is refreshed and "b" becomes the oldest
+    cache = SourceCache(fetcher, folder, max_size=25)
+    assert cache.get("a") == paths["a"]
+    assert os.path.getmtime(paths["a"]) > 1002
+    assert not os.path.exists(paths["b"])
+    assert os.path.exists(paths["c"])
+
+    # Without sources in use, only the most recently used fits
+    cache = SourceCache(fetcher, folder, max_size=15)
+    cache.evict()
+    assert os.listdir(folder) == [os.path.basename(paths["a"])]
+
+    cache = SourceCache(fetcher, folder, max_size=0)
+    cache.evict()
+    assert os.listdir(folder) == []
+
+
+def test_source_cache_failed_fetch(tmp_path):
+    cache = SourceCache(LocalFetcher(_sources(tmp_path, [])), str(tmp_path / "cache"))
+
+    assert cache.get("missing") is None
+    # The partial file of the fetch is never cached
+    assert os.listdir(cache.folder) == []
+
+
+def test_download_videos_fetches_each_source_once(tmp_path):
+    fetcher = CountingFetcher(_sources(tmp_path, ["a", "b"]))
+    cache = SourceCache(fetcher, str(tmp_path / "cache"))
+    folder = str(tmp_path / "videos")
+    df_links = pd.DataFrame(
+        {
+            "name": ["hola", "adios", "casa", "verde"],
+            "id": ["a", "b", "a", "missing"],
+            "start_time": [np.nan] * 4,
+            "duration_time": [np.nan] * 4,
+        }
+    )
+
+    sources = download_videos(df_links, cache, jobs=2, folder=folder)
+
+    assert fetcher.fetched == ["a", "b", "missing"]
+    assert sources == [cache.path("a"), cache.path("b")]
+    for name, video_id in (("hola", "a"), ("adios", "b"), ("casa", "a")):
+        clip = os.path.join(folder, name, f"{name}-{video_id}.mp4")
+        with open(clip, "rb") as f:
+            assert f.read() == video_id.encode() * 10
+
+    # Sources whose clips all exist are not fetched again
+    fetcher.fetched.clear()
+    assert download_videos(df_links, cache, jobs=2, folder=folder) == []
+    assert fetcher.fetched == ["missing"]
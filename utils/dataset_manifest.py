@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+from typing import List, Tuple
+
+from utils.landmark_store import LANDMARK_STORE_FOLDER, LandmarkStore
+
+
+VIDEOS_FOLDER = os.path.join("data", "videos")
+MANIFEST_PATH = os.path.join(LANDMARK_STORE_FOLDER, "manifest.json")
+
+
+def file_hash(path: str, chunk_size=1 << 20) -> str:
+    """
+    :return: sha1 of the content of the file
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetManifest(object):
+    """
+    Record of the videos whose landmarks are in the LandmarkStore:
+
+        {video_name: {"path", "size", "mtime", "sha1", "offset", "length", "fps",
+                      "target_fps", "max_resolution"}}
+
+    A video is fresh when it was extracted with the same options and its size and
+    mtime did not change, or its content hash is still the same (the file was only
+    touched). Otherwise it is new or changed and its landmarks have to be extracted
+    again. Clips ingested without a clip file (see record_ingested) record the window
+    of their source instead, and stay fresh
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        """
+        :param path: json file of the manifest, created by save
+        """
+        self.path = path
+        self.entries = {}
+        # Path and hash of the stale videos, computed by scan
+        self._pending = {}
+        # Extraction options of the last scan
+        self._options = {"target_fps": None, "max_resolution": None}
+
+        if os.path.exists(path):
+            with open(path) as file:
+                self.entries = json.load(file)
+
+    def scan(
+        self, videos_folder=VIDEOS_FOLDER, target_fps=None, max_resolution=None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Compare the videos on disk with the manifest, the entries of the deleted
+        videos are dropped
+
+        :param videos_folder: data/videos/<sign>/<video_name>.mp4
+        :param target_fps, max_resolution: extraction options, see
+                                           save_landmarks_from_video
+        :return: names of the fresh videos, names of the new or changed videos
+        """
+        self._options = {"target_fps": target_fps, "max_resolution": max_resolution}
+        fresh, stale = [], []
+        found = set()
+        for root, dirs, files in os.walk(videos_folder):
+            # The files at the top are the sources being cut by yt_download.py
+            if os.path.samefile(root, videos_folder):
+                continue
+            for file_name in files:
+                if not file_name.endswith(".mp4"):
+                    continue
+                video_name = file_name.replace(".mp4", "")
+                path = os.path.join(root, file_name)
+                found.add(video_name)
+                if self._is_fresh(video_name, path):
+                    fresh.append(video_name)
+                else:
+                    stale.append(video_name)
+
+        for video_name in set(self.entries) - found:
+            if "source" in self.entries[video_name]:
+                fresh.append(video_name)
+            else:
+                del self.entries[video_name]
+        return fresh, stale
+
+    def record(self, video_name: str, store: LandmarkStore):
+        """
+        Mark a stale video returned by scan as extracted, with its current stat, hash
+        and clip of the store
+        """
+        path, sha1 = self._pending.pop(video_name)
+        stat = os.stat(path)
+        _, offset, length, fps = store.entries[video_name]
+        self.entries[video_name] = {
+            "path": path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha1": sha1,
+            "offset": offset,
+            "length": length,
+            "fps": fps,
+            **self._options,
+        }
+
+    def record_ingested(
+        self,
+        video_name: str,
+        store: LandmarkStore,
+        source: str,
+        start_time=None,
+        duration_time=None,
+        clip_file=None,
+        target_fps=None,
+        max_resolution=None,
+    ):
+        """
+        Mark a clip extracted by ingest_clip. With a clip file, the entry is the same
+        as for the videos of data/videos, otherwise it holds the window of the source
+        """
+        _, offset, length, fps = store.entries[video_name]
+        entry = {
+            "offset": offset,
+            "length": length,
+            "fps": fps,
+            "target_fps": target_fps,
+            "max_resolution": max_resolution,
+        }
+        if clip_file is None:
+            entry.update(
+                source=source, start_time=start_time, duration_time=duration_time
+            )
+        else:
+            stat = os.stat(clip_file)
+            entry.update(
+                path=clip_file,
+                size=stat.st_size,
+                mtime=stat.st_mtime_ns,
+                sha1=file_hash(clip_file),
+            )
+        self.entries[video_name] = entry
+
+    def relocate(self, store: LandmarkStore):
+        """
+        Update the offsets of the entries after LandmarkStore.compact
+        """
+        for video_name, entry in self.entries.items():
+            if video_name in store:
+                entry["offset"] = store.entries[video_name][1]
+
+    def save(self):
+        # Written aside then renamed, so an interrupted save keeps the old manifest
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(self.entries, file)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _is_fresh(self, video_name: str, path: str) -> bool:
+        entry = self.entries.get(video_name)
+        # Entries of ingested clips without a clip file have no stat to compare
+        if entry is not None and (
+            "sha1" not in entry
+            or any(entry.get(option) != value for option, value in self._options.items())
+        ):
+            entry = None
+        stat = os.stat(path)
+        if entry is not None and (entry["size"], entry["mtime"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return True
+
+        # Only hashed when the stat changed
+        sha1 = file_hash(path)
+        if entry is not None and entry["sha1"] == sha1:
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime_ns
+            return True
+        self._pending[video_name] = (path, sha1)
+        return False
@@ -1,53 +1,242 @@
 import os
+import shutil
+from multiprocessing import Pool
 
-import pandas as pd
+import numpy as np
+import mediapipe as mp
 from tqdm import tqdm
 
 from models.sign_model import SignModel
-from utils.landmark_utils import save_landmarks_from_video, load_array
-
-
-def load_dataset():
-    videos = [
-        file_name.replace(".mp4", "")
-        for root, dirs, files in os.walk(os.path.join("data", "videos"))
-        for file_name in files
-        if file_name.endswith(".mp4")
-    ]
-    dataset = [
-        file_name.replace(".pickle", "").replace("pose_", "")
-        for root, dirs, files in os.walk(os.path.join("data", "dataset"))
-        for file_name in files
-        if file_name.endswith(".pickle") and file_name.startswith("pose_")
-    ]
+from utils.dataset_manifest import VIDEOS_FOLDER, DatasetManifest
+from utils.embedding_cache import EmbeddingCache, clip_key
+from utils.landmark_store import (
+    DATASET_FOLDER,
+    MAX_ORPHANED_FRACTION,
+    LandmarkStore,
+)
+from utils.landmark_utils import (
+    save_landmarks_from_frames,
+    save_landmarks_from_video,
+    stream_clip,
+)
+from utils.prototypes import PROTOTYPES_FOLDER, load_prototypes
+from utils.reference_index import ReferenceIndex
+
+
+# Holistic, extraction options and staging folder of the worker process,
+# set by _init_extraction_worker
+_worker_holistic = None
+_worker_options = {}
+_worker_staging = None
+
+
+def _init_extraction_worker(options, staging_folder):
+    global _worker_holistic, _worker_options, _worker_staging
+    _worker_holistic = mp.solutions.holistic.Holistic(
+        min_detection_confidence=0.5, min_tracking_confidence=0.5
+    )
+    _worker_options = options
+    _worker_staging = staging_folder
+
+
+def _extract_video(video_name):
+    """
+    The workers cannot append to the shared store, so each video is streamed to a
+    store of its own which the parent process copies and deletes
+    """
+    folder = os.path.join(_worker_staging, video_name)
+    shutil.rmtree(folder, ignore_errors=True)
+    save_landmarks_from_video(
+        video_name, LandmarkStore(folder), _worker_holistic, **_worker_options
+    )
+    return video_name, folder
+
+
+def load_dataset(
+    n_workers=1,
+    store: LandmarkStore = None,
+    manifest: DatasetManifest = None,
+    target_fps=None,
+    max_resolution=None,
+    channels=None,
+):
+    """
+    :param n_workers: number of processes extracting the landmarks of the new videos,
+                      each one loads a single Holistic model and reuses it
+    :param store: LandmarkStore the landmarks are appended to, data/landmarks by default.
+                  The clips of the old data/dataset layout are migrated into an empty one
+    :param manifest: DatasetManifest of the extracted videos, only the new or changed
+                     videos are extracted again
+    :param target_fps, max_resolution: frame rate decimation and downscaling of the
+                                       extraction, see save_landmarks_from_video.
+                                       Changing them extracts all the videos again
+    :param channels: landmark channels extracted and stored, e.g. HAND_CHANNELS to skip
+                     the pose which the recognition does not use (ALL_CHANNELS by
+                     default). Only used when the store is created here
+    :return: list of the video names of the dataset
+    """
+    if store is None:
+        store = LandmarkStore(channels=channels)
+    if manifest is None:
+        manifest = DatasetManifest()
+    if len(store) == 0 and os.path.isdir(DATASET_FOLDER):
+        n = store.migrate()
+        print(f"\nMigrated {n} clips from {DATASET_FOLDER} to {store.folder}\n")
+
+    options = {"target_fps": target_fps, "max_resolution": max_resolution}
+    fresh, stale = manifest.scan(**options)
+
+    # Clips extracted before the manifest existed (or migrated) are kept as they are,
+    # they were extracted from every frame at full resolution
+    default_options = target_fps is None and max_resolution is None
+    videos_not_in_dataset = []
+    for video_name in stale:
+        if (
+            default_options
+            and video_name in store
+            and video_name not in manifest.entries
+        ):
+            manifest.record(video_name, store)
+            fresh.append(video_name)
+        else:
+            videos_not_in_dataset.append(video_name)
 
     # Create the dataset from the reference videos
-    videos_not_in_dataset = list(set(videos).difference(set(dataset)))
     n = len(videos_not_in_dataset)
     if n > 0:
         print(f"\nExtracting landmarks from new videos: {n} videos detected\n")
 
-        for idx in tqdm(range(n)):
-            save_landmarks_from_video(videos_not_in_dataset[idx])
+        if n_workers > 1 and n > 1:
+            # Only this process writes to the store
+            staging_folder = os.path.join(store.folder, "staging")
+            try:
+                with Pool(
+                    min(n_workers, n),
+                    initializer=_init_extraction_worker,
+                    initargs=(options, staging_folder),
+                ) as pool:
+                    for video_name, folder in tqdm(
+                        pool.imap_unordered(_extract_video, videos_not_in_dataset),
+                        total=n,
+                    ):
+                        store.copy_clip(LandmarkStore(folder), video_name)
+                        manifest.record(video_name, store)
+                        shutil.rmtree(folder)
+            finally:
+                shutil.rmtree(staging_folder, ignore_errors=True)
+        else:
+            for idx in tqdm(range(n)):
+                save_landmarks_from_video(videos_not_in_dataset[idx], store, **options)
+                manifest.record(videos_not_in_dataset[idx], store)
 
-    return videos
+    # The frames of the videos extracted again are only reclaimed by compact
+    if store.orphaned_frames > MAX_ORPHANED_FRACTION * store.n_frames:
+        n = store.compact()
+        manifest.relocate(store)
+        print(f"\nCompacted {store.folder}: {n} orphaned frames reclaimed\n")
 
+    manifest.save()
+    return fresh + videos_not_in_dataset
 
-def load_reference_signs(videos):
-    reference_signs = {"name": [], "sign_model": [], "distance": []}
-    for video_name in videos:
-        sign_name = video_name.split("-")[0]
-        path = os.path.join("data", "dataset", sign_name, video_name)
-
-        left_hand_list = load_array(os.path.join(path, f"lh_{video_name}.pickle"))
-        right_hand_list = load_array(os.path.join(path, f"rh_{video_name}.pickle"))
-
-        reference_signs["name"].append(sign_name)
-        reference_signs["sign_model"].append(SignModel(left_hand_list, right_hand_list))
-        reference_signs["distance"].append(0)
-    
-    reference_signs = pd.DataFrame(reference_signs, dtype=object)
-    print(
-        f'Dictionary count: {reference_signs[["name", "sign_model"]].groupby(["name"]).count()}'
+
+def ingest_clip(
+    video_name,
+    source,
+    start_time=None,
+    duration_time=None,
+    store: LandmarkStore = None,
+    manifest: DatasetManifest = None,
+    holistic=None,
+    target_fps=None,
+    max_resolution=None,
+    keep_clip=False,
+):
+    """
+    Extract the landmarks of a window of a source video straight from the frames
+    decoded by ffmpeg (see stream_clip), the clip file is optional
+
+    :param video_name: name of the clip, <sign>-<id>
+    :param source: path of the source video, e.g. downloaded by yt_download.py
+    :param start_time, duration_time: window of the clip, None for the whole video
+    :param store, manifest: see load_dataset, they are not saved if given
+    :param holistic: optional mediapipe Holistic reused across clips
+    :param target_fps, max_resolution: see load_dataset, they should be the same
+    :param keep_clip: also save data/videos/<sign>/<video_name>.mp4
+    """
+    save = manifest is None
+    if store is None:
+        store = LandmarkStore()
+    if manifest is None:
+        manifest = DatasetManifest()
+
+    clip_file = None
+    if keep_clip:
+        clip_folder = os.path.join(VIDEOS_FOLDER, video_name.split("-")[0])
+        os.makedirs(clip_folder, exist_ok=True)
+        clip_file = os.path.join(clip_folder, video_name + ".mp4")
+
+    frames, fps = stream_clip(
+        source, start_time, duration_time, target_fps, max_resolution, clip_file
+    )
+    save_landmarks_from_frames(video_name, frames, fps, store, holistic)
+    manifest.record_ingested(
+        video_name,
+        store,
+        source,
+        start_time,
+        duration_time,
+        clip_file,
+        target_fps,
+        max_resolution,
     )
+    if save:
+        manifest.save()
+
+
+def load_reference_signs(
+    videos, compact=False, use_prototypes=False, store: LandmarkStore = None
+):
+    """
+    :param videos: list of the video names of the dataset
+    :param compact: build the embeddings with the upper-triangle layout,
+                    the SignRecorder must then be created with the same value
+    :param use_prototypes: load the per-sign prototypes built by build_prototypes.py
+                           instead of one reference per clip
+    :param store: LandmarkStore the clips are read from, data/landmarks by default.
+                  The embeddings are cached in data/embeddings, see EmbeddingCache
+    :return: ReferenceIndex of the reference signs
+    """
+    if use_prototypes:
+        reference_signs = load_prototypes(PROTOTYPES_FOLDER)
+        if np.any(reference_signs.compact != compact):
+            raise ValueError(
+                "The prototypes were not built with compact="
+                f"{compact}, run build_prototypes.py again"
+            )
+        print(f"Prototype count: {reference_signs.sign_counts()}")
+        return reference_signs
+
+    if store is None:
+        store = LandmarkStore()
+
+    cache = EmbeddingCache(compact)
+
+    names, keys, sign_models = [], [], []
+    for video_name in videos:
+        landmarks = store.get(video_name)
+        key = clip_key(landmarks["left_hand"], landmarks["right_hand"])
+        sign_model = cache.get(key)
+        if sign_model is None:
+            sign_model = SignModel(landmarks["left_hand"], landmarks["right_hand"], compact)
+
+        names.append(video_name.split("-")[0])
+        keys.append(key)
+        sign_models.append(sign_model)
+
+    # Only rewritten when a clip was added, changed or removed
+    if set(keys) != set(cache.sign_models):
+        cache.save(keys, sign_models)
+
+    reference_signs = ReferenceIndex(names, sign_models)
+    print(f"Dictionary count: {reference_signs.sign_counts()}")
     return reference_signs
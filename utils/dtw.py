@@ -1,41 +1,282 @@
-import pandas as pd
 from fastdtw import fastdtw
 import numpy as np
 from models.sign_model import SignModel
+from utils.reference_index import ReferenceIndex
 
 
-def dtw_distances(recorded_sign: SignModel, reference_signs: pd.DataFrame):
+DTW_BACKENDS = ("fastdtw", "exact")
+DTW_BANDS = (None, "sakoe_chiba", "itakura")
+
+
+def dtw_distances(
+    recorded_sign: SignModel,
+    reference_signs: ReferenceIndex,
+    backend="fastdtw",
+    band=None,
+    band_width=10,
+    max_slope=2.0,
+    positions=None,
+    max_length_ratio=None,
+) -> ReferenceIndex:
     """
     Use DTW to compute similarity between the recorded sign & the reference signs
 
     :param recorded_sign: a SignModel object containing the data gathered during record
-    :param reference_signs: pd.DataFrame
-                            columns : name, dtype: str
-                                      sign_model, dtype: SignModel
-                                      distance, dtype: float64
-    :return: Return a sign dictionary sorted by the distances from the recorded sign
+    :param reference_signs: ReferenceIndex of the reference signs
+    :param backend: "fastdtw" (approximate) or "exact"
+    :param band: global constraint of the "exact" backend, see batch_dtw
+    :param band_width: Sakoe-Chiba radius, see batch_dtw
+    :param max_slope: Itakura maximum slope, see batch_dtw
+    :param positions: if given, only these references are compared
+    :param max_length_ratio: optional length cutoff, see ReferenceIndex.partitions
+    :return: Return the ReferenceIndex with the distances from the recorded sign
     """
+    if backend not in DTW_BACKENDS:
+        raise ValueError(f"Unknown DTW backend: {backend}")
+
     # Embeddings of the recorded sign
     rec_left_hand = recorded_sign.lh_embedding
     rec_right_hand = recorded_sign.rh_embedding
 
-    for idx, row in reference_signs.iterrows():
-        # Initialize the row variables
-        ref_sign_name, ref_sign_model, _ = row
+    def pair_distance(x, y):
+        if backend == "fastdtw":
+            return list(fastdtw(x, y))[0]
+        return batch_dtw(
+            x, y[None], np.array([len(y)]), band, band_width, max_slope
+        )[0]
+
+    # Only the references using the same hands are visited, the others stay at np.inf
+    candidates = reference_signs.candidates(recorded_sign, max_length_ratio)
+    if positions is not None:
+        candidates = np.intersect1d(candidates, positions)
+    reference_signs.distances[:] = np.inf
+
+    for idx in candidates:
+        ref_sign_model = reference_signs.sign_model(idx)
+        ref_left_hand = ref_sign_model.lh_embedding
+        ref_right_hand = ref_sign_model.rh_embedding
+
+        distance = 0
+        if recorded_sign.has_left_hand:
+            distance += pair_distance(rec_left_hand, ref_left_hand)
+        if recorded_sign.has_right_hand:
+            distance += pair_distance(rec_right_hand, ref_right_hand)
+
+        reference_signs.distances[idx] = distance
+    return reference_signs
+
+
+def band_limits(
+    query_length: int,
+    lengths: np.ndarray,
+    band=None,
+    band_width=10,
+    max_slope=2.0,
+):
+    """
+    Global constraint of the DTW as the range of reference frames each query frame
+    may be aligned with. The diagonal is rescaled to the length of each reference and
+    the band always keeps a connected corridor around it, so a warping path exists
+
+    :param query_length: number of frames of the query
+    :param lengths: number of frames of each reference
+    :param band: None (no constraint), "sakoe_chiba" or "itakura"
+    :param band_width: Sakoe-Chiba radius, in reference frames around the diagonal
+    :param max_slope: maximum slope of the Itakura parallelogram
+    :return: two int arrays of shape (query_length, n_references), the first and last
+             reference frames (1-indexed, inclusive) allowed for each query frame
+    """
+    lengths = np.asarray(lengths)
+    if band not in DTW_BANDS:
+        raise ValueError(f"Unknown DTW band: {band}")
+
+    last = np.maximum(lengths, 1)[None, :].astype(np.float64)
+    if band is None or query_length <= 1:
+        low = np.ones((query_length, len(lengths)), dtype=np.int64)
+        high = np.broadcast_to(lengths, low.shape).astype(np.int64)
+        return low, np.maximum(high, 1)
+
+    # Position on the rescaled diagonal, in [0, 1]
+    x = (np.arange(query_length, dtype=np.float64) / (query_length - 1))[:, None]
+    center = 1 + x * (last - 1)
+
+    # Smallest radius keeping consecutive rows connected
+    radius = np.maximum((last - 1) / (query_length - 1) - 1, 0) / 2
+    if band == "sakoe_chiba":
+        radius = np.maximum(radius, band_width)
+    low = np.floor(center - radius)
+    high = np.ceil(center + radius)
+
+    if band == "itakura":
+        y_low = np.maximum(x / max_slope, 1 - max_slope * (1 - x))
+        y_high = np.minimum(max_slope * x, 1 - (1 - x) / max_slope)
+        low = np.minimum(low, np.ceil(1 + y_low * (last - 1)))
+        high = np.maximum(high, np.floor(1 + y_high * (last - 1)))
+
+    low = np.clip(low, 1, last).astype(np.int64)
+    high = np.clip(high, 1, last).astype(np.int64)
+    return low, high
+
+
+def batch_dtw(
+    query: np.ndarray,
+    references: np.ndarray,
+    lengths: np.ndarray,
+    band=None,
+    band_width=10,
+    max_slope=2.0,
+    max_distance=None,
+) -> np.ndarray:
+    """
+    Exact DTW (L1 metric, same as the fastdtw default) between one sequence and
+    a batch of zero-padded sequences, vectorized over the batch
+
+    The rows of the accumulated cost matrix are computed one at a time. Within a row,
+    D[i, j] = c[j] + min(b[j], D[i, j - 1]) with b[j] = min(D[i-1, j-1], D[i-1, j]),
+    which unrolls to D[i, j] = C[j] + min_{k <= j}(b[k] - C[k - 1]) where C is the
+    cumulative sum of c, so a whole row is a cumsum and a minimum.accumulate.
+    With a band, the cells outside of it can neither be entered nor kept
+
+    :param query: array of shape (n_frame, nb_features)
+    :param references: array of shape (n_references, max_n_frame, nb_features)
+    :param lengths: number of valid frames of each reference
+    :param band: None, "sakoe_chiba" or "itakura", see band_limits
+    :param band_width: Sakoe-Chiba radius, in reference frames
+    :param max_slope: maximum slope of the Itakura parallelogram
+    :param max_distance: early abandoning threshold, every warping path goes through
+                         each row so a reference is abandoned (np.inf) as soon as
+                         the minimum of a row exceeds it
+    :return: array of shape (n_references,) with the DTW distances
+    """
+    n_references, max_length, _ = references.shape
+    previous = np.full((n_references, max_length + 1), np.inf)
+    previous[:, 0] = 0
+
+    columns = np.arange(1, max_length + 1)
+    abandoned = np.zeros(n_references, dtype=bool)
+    if max_distance is not None:
+        padding = columns > np.asarray(lengths)[:, None]
+    if band is not None:
+        low, high = band_limits(len(query), lengths, band, band_width, max_slope)
 
+    for i, frame in enumerate(query):
+        cost = np.abs(references - frame).sum(axis=2, dtype=np.float64)
+        cumulative = np.cumsum(cost, axis=1)
+        entry = np.minimum(previous[:, :-1], previous[:, 1:])
+        if band is not None:
+            outside = (columns < low[i][:, None]) | (columns > high[i][:, None])
+            entry[outside] = np.inf
+        previous[:, 0] = np.inf
+        previous[:, 1:] = cumulative + np.minimum.accumulate(
+            entry - (cumulative - cost), axis=1
+        )
+        if band is not None:
+            previous[:, 1:][outside] = np.inf
 
-        if (recorded_sign.has_left_hand == ref_sign_model.has_left_hand) and (
-            recorded_sign.has_right_hand == ref_sign_model.has_right_hand
-        ):
-            ref_left_hand = ref_sign_model.lh_embedding
-            ref_right_hand = ref_sign_model.rh_embedding
+        if max_distance is not None:
+            row_min = np.where(padding, np.inf, previous[:, 1:]).min(axis=1)
+            abandoned |= row_min > max_distance
+            if abandoned.all():
+                break
 
+    distances = previous[np.arange(n_references), lengths]
+    distances[abandoned] = np.inf
+    if len(query) == 0:
+        distances[:] = np.inf
+    return distances
+
+
+def dtw_path(x: np.ndarray, y: np.ndarray):
+    """
+    Exact DTW (L1 metric) between two sequences, with its optimal warping path
+
+    :param x: array of shape (n_frame_x, nb_features)
+    :param y: array of shape (n_frame_y, nb_features)
+    :return: the DTW distance and the list of aligned (x index, y index) pairs
+    """
+    n, m = len(x), len(y)
+    accumulated = np.full((n + 1, m + 1), np.inf)
+    accumulated[0, 0] = 0
+    for i in range(n):
+        cost = np.abs(y - x[i]).sum(axis=1, dtype=np.float64)
+        cumulative = np.cumsum(cost)
+        entry = np.minimum(accumulated[i, :-1], accumulated[i, 1:])
+        accumulated[i + 1, 1:] = cumulative + np.minimum.accumulate(
+            entry - (cumulative - cost)
+        )
+
+    path = [(n - 1, m - 1)]
+    i, j = n, m
+    while (i, j) != (1, 1):
+        steps = [(i - 1, j - 1), (i - 1, j), (i, j - 1)]
+        i, j = min(steps, key=lambda step: accumulated[step])
+        path.append((i - 1, j - 1))
+    return accumulated[n, m], path[::-1]
+
+
+class BatchDTWMatcher(object):
+    """
+    Compare a recorded sign to all the compatible reference signs in one call per
+    partition of the ReferenceIndex, using their padded tensors instead of
+    iterating over the references
+    """
+
+    def __init__(
+        self,
+        reference_signs: ReferenceIndex,
+        band=None,
+        band_width=10,
+        max_slope=2.0,
+        max_length_ratio=None,
+    ):
+        """
+        :param reference_signs: ReferenceIndex (see dtw_distances)
+        :param band, band_width, max_slope: global constraint, see batch_dtw
+        :param max_length_ratio: optional length cutoff, see ReferenceIndex.partitions
+        """
+        self.reference_signs = reference_signs
+        self.band = band
+        self.band_width = band_width
+        self.max_slope = max_slope
+        self.max_length_ratio = max_length_ratio
+
+    def distances(self, recorded_sign: SignModel) -> np.ndarray:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: array of the distances to each reference sign, in the order of the
+                 references (np.inf if the hands used or the lengths do not match)
+        """
+        distances = np.full(len(self.reference_signs), np.inf)
+        partitions = self.reference_signs.partitions(recorded_sign, self.max_length_ratio)
+
+        for positions, store in partitions:
+            partition_distances = np.zeros(len(positions))
             if recorded_sign.has_left_hand:
-                row["distance"] += list(fastdtw(rec_left_hand, ref_left_hand))[0]
+                partition_distances += batch_dtw(
+                    recorded_sign.lh_embedding,
+                    store.lh_embeddings,
+                    store.lh_lengths,
+                    self.band,
+                    self.band_width,
+                    self.max_slope,
+                )
             if recorded_sign.has_right_hand:
-                row["distance"] += list(fastdtw(rec_right_hand, ref_right_hand))[0]
-
+                partition_distances += batch_dtw(
+                    recorded_sign.rh_embedding,
+                    store.rh_embeddings,
+                    store.rh_lengths,
+                    self.band,
+                    self.band_width,
+                    self.max_slope,
+                )
+            distances[positions] = partition_distances
+        return distances
 
-        else:
-            row["distance"] = np.inf
-    return reference_signs.sort_values(by=["distance"])
+    def __call__(self, recorded_sign: SignModel) -> ReferenceIndex:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: Return the ReferenceIndex with the distances from the recorded sign,
+                 same as dtw_distances
+        """
+        self.reference_signs.distances[:] = self.distances(recorded_sign)
+        return self.reference_signs
@@ -0,0 +1,111 @@
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.hand_model import get_n_features
+from models.sign_model import FEATURE_VERSION, SignModel
+
+
+EMBEDDINGS_FOLDER = os.path.join("data", "embeddings")
+
+
+def clip_key(left_hand: np.ndarray, right_hand: np.ndarray) -> str:
+    """
+    :param left_hand, right_hand: landmarks of a clip, as read from the LandmarkStore
+    :return: hash of the landmarks and of FEATURE_VERSION, identifying the embeddings
+             computed from them
+    """
+    digest = hashlib.sha1(f"v{FEATURE_VERSION}".encode())
+    for landmarks in (left_hand, right_hand):
+        landmarks = np.ascontiguousarray(landmarks, dtype=np.float32)
+        digest.update(str(landmarks.shape).encode())
+        digest.update(landmarks.tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingCache(object):
+    """
+    Embeddings of the reference clips saved in one npz file per layout
+    (data/embeddings/embeddings.npz, embeddings_compact.npz), looked up by clip_key.
+    A clip whose landmarks changed gets a new key, and the whole file is ignored when
+    it was written with another FEATURE_VERSION
+    """
+
+    def __init__(self, compact=False, folder=EMBEDDINGS_FOLDER):
+        """
+        :param compact: layout of the embeddings, see SignModel
+        :param folder: folder of the cache files
+        """
+        self.compact = compact
+        self.path = os.path.join(
+            folder, "embeddings_compact.npz" if compact else "embeddings.npz"
+        )
+        self.sign_models: Dict[str, SignModel] = {}
+
+        if os.path.exists(self.path):
+            with np.load(self.path) as arrays:
+                if int(arrays["feature_version"]) == FEATURE_VERSION:
+                    self._unpack(dict(arrays))
+
+    def get(self, key: str) -> Optional[SignModel]:
+        """
+        :return: the cached SignModel of the clip, None if it is not in the cache
+        """
+        return self.sign_models.get(key)
+
+    def save(self, keys: List[str], sign_models: List[SignModel]):
+        """
+        Replace the cache file by these clips, the keys no longer used are dropped
+
+        :param keys: clip_key of each clip
+        :param sign_models: SignModels computed from the clips, same layout as the cache
+        """
+        lh_embeddings, lh_offsets = self._pack([m.lh_embedding for m in sign_models])
+        rh_embeddings, rh_offsets = self._pack([m.rh_embedding for m in sign_models])
+        arrays = {
+            "feature_version": np.array(FEATURE_VERSION),
+            "keys": np.asarray(keys, dtype=str),
+            "has_hands": np.array(
+                [[m.has_left_hand, m.has_right_hand] for m in sign_models], dtype=bool
+            ).reshape((-1, 2)),
+            "lh_embeddings": lh_embeddings,
+            "lh_offsets": lh_offsets,
+            "rh_embeddings": rh_embeddings,
+            "rh_offsets": rh_offsets,
+        }
+
+        # Written aside then renamed, so an interrupted save keeps the old file
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path.replace(".npz", ".tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+        self.sign_models = dict(zip(keys, sign_models))
+
+    @staticmethod
+    def _pack(embeddings: List[np.ndarray]):
+        offsets = np.zeros(len(embeddings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(embedding) for embedding in embeddings])
+        non_empty = [embedding for embedding in embeddings if len(embedding)]
+        if not non_empty:
+            return np.zeros((0, 0), dtype=np.float32), offsets
+        return np.concatenate(non_empty).astype(np.float32), offsets
+
+    def _unpack(self, arrays: Dict[str, np.ndarray]):
+        lh_embeddings, lh_offsets = arrays["lh_embeddings"], arrays["lh_offsets"]
+        rh_embeddings, rh_offsets = arrays["rh_embeddings"], arrays["rh_offsets"]
+        n_features = get_n_features(self.compact)
+
+        for idx, key in enumerate(arrays["keys"]):
+            lh_embedding = lh_embeddings[lh_offsets[idx] : lh_offsets[idx + 1]]
+            rh_embedding = rh_embeddings[rh_offsets[idx] : rh_offsets[idx + 1]]
+            self.sign_models[str(key)] = SignModel.from_arrays(
+                {
+                    "has_hands": arrays["has_hands"][idx],
+                    "compact": np.array(self.compact),
+                    "lh_embedding": lh_embedding.reshape((-1, n_features)),
+                    "rh_embedding": rh_embedding.reshape((-1, n_features)),
+                }
+            )
@@ -0,0 +1,274 @@
+import heapq
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.dtw import band_limits, batch_dtw
+from utils.reference_index import ReferenceIndex
+
+
+def lb_kim(query: np.ndarray, references: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Lower bound of the DTW: every warping path starts with the first frames of
+    both sequences and ends with their last frames
+
+    :param query: array of shape (n_frame, nb_features)
+    :param references: zero-padded array of shape (n_references, max_n_frame, nb_features)
+    :param lengths: number of valid frames of each reference
+    :return: array of shape (n_references,)
+    """
+    last_frames = references[np.arange(len(references)), np.maximum(lengths, 1) - 1]
+    return lb_kim_ends(query, references[:, 0], last_frames, lengths)
+
+
+def lb_kim_ends(
+    query: np.ndarray, first_frames: np.ndarray, last_frames: np.ndarray, lengths
+) -> np.ndarray:
+    """
+    Same as lb_kim from the first and last frames of the references only
+
+    :param first_frames, last_frames: arrays of shape (n_references, nb_features),
+                                      zeros for the empty references
+    """
+    first = np.abs(first_frames - query[0]).sum(axis=1, dtype=np.float64)
+    last = np.abs(last_frames - query[-1]).sum(axis=1, dtype=np.float64)
+
+    # With a single cell on both sides the first and last cells are the same
+    last[(len(query) == 1) & (lengths <= 1)] = 0
+    return first + last
+
+
+def end_frames(embeddings: np.ndarray, offsets: np.ndarray):
+    """
+    :param embeddings, offsets: packed embeddings of one hand, see ReferenceIndex
+    :return: first and last frame of each reference, zeros for the empty ones
+    """
+    lengths = np.diff(offsets)
+    n_features = embeddings.shape[1] if embeddings.ndim == 2 else 0
+    first = np.zeros((len(lengths), n_features), dtype=np.float32)
+    last = np.zeros((len(lengths), n_features), dtype=np.float32)
+    valid = lengths > 0
+    first[valid] = embeddings[offsets[:-1][valid]]
+    last[valid] = embeddings[offsets[1:][valid] - 1]
+    return first, last
+
+
+def lb_keogh(
+    query: np.ndarray,
+    references: np.ndarray,
+    lengths: np.ndarray,
+    band=None,
+    band_width=10,
+    max_slope=2.0,
+) -> np.ndarray:
+    """
+    Lower bound of the DTW: every frame of a reference is aligned with at least
+    one of the query frames allowed by the band, so it costs at least its distance
+    to the envelope (min/max box) of these query frames
+
+    The envelopes are read from a sparse table of running min/max of the query,
+    built once per query, so the bound costs O(n_references * max_n_frame)
+
+    :param query: array of shape (n_frame, nb_features)
+    :param references: zero-padded array of shape (n_references, max_n_frame, nb_features)
+    :param lengths: number of valid frames of each reference
+    :param band, band_width, max_slope: global constraint, see utils.dtw.batch_dtw
+    :return: array of shape (n_references,)
+    """
+    n_frame = len(query)
+    n_references, max_length, _ = references.shape
+
+    # Query frames allowed for each reference frame: [first, last] (0-indexed)
+    low, high = band_limits(n_frame, lengths, band, band_width, max_slope)
+    columns = np.arange(1, max_length + 1)
+    first = np.minimum((high[:, :, None] < columns).sum(axis=0), n_frame - 1)
+    last = np.maximum((low[:, :, None] <= columns).sum(axis=0) - 1, first)
+
+    # Sparse table: level k holds the min/max of the query over 2 ** k frames
+    minimums, maximums = [query], [query]
+    while 2 ** len(minimums) <= n_frame:
+        step = 2 ** (len(minimums) - 1)
+        minimums.append(np.minimum(minimums[-1][:-step], minimums[-1][step:]))
+        maximums.append(np.maximum(maximums[-1][:-step], maximums[-1][step:]))
+
+    level = np.floor(np.log2(last - first + 1)).astype(np.int64)
+    end = last - 2 ** level + 1
+    lower = np.empty(references.shape, dtype=query.dtype)
+    upper = np.empty(references.shape, dtype=query.dtype)
+    for k in range(len(minimums)):
+        mask = level == k
+        lower[mask] = np.minimum(minimums[k][first[mask]], minimums[k][end[mask]])
+        upper[mask] = np.maximum(maximums[k][first[mask]], maximums[k][end[mask]])
+
+    deviation = np.maximum(references - upper, 0) + np.maximum(lower - references, 0)
+    deviation = deviation.sum(axis=2, dtype=np.float64)
+    deviation[columns > lengths[:, None]] = 0
+    return deviation.sum(axis=1)
+
+
+class KNNMatcher(object):
+    """
+    k-nearest reference signs with the exact DTW backend, without computing the
+    DTW of every reference:
+        1. LB_Kim of all the references, the k lowest seed the top-k heap
+        2. LB_Keogh of the references whose LB_Kim is below the current k-th best
+        3. DTW, in ascending LB_Keogh order, of the references whose bound is below
+           the current k-th best, abandoned as soon as a row exceeds it
+
+    Only the first and last frames of the references are read for LB_Kim, the
+    padded frames of the partitions (see ReferenceIndex.partitions) are gathered
+    for the references left to LB_Keogh and DTW
+
+    The top-k is the same as the one of BatchDTWMatcher with the same band
+    """
+
+    def __init__(
+        self,
+        reference_signs: ReferenceIndex,
+        k=5,
+        band=None,
+        band_width=10,
+        max_slope=2.0,
+        max_length_ratio=None,
+    ):
+        """
+        :param reference_signs: ReferenceIndex (see utils.dtw.dtw_distances)
+        :param k: number of nearest reference signs to find
+        :param band, band_width, max_slope: global constraint, see utils.dtw.batch_dtw
+        :param max_length_ratio: optional length cutoff, see ReferenceIndex.partitions
+        """
+        self.reference_signs = reference_signs
+        self.k = k
+        self.band_kwargs = dict(band=band, band_width=band_width, max_slope=max_slope)
+        self.max_length_ratio = max_length_ratio
+
+        # First frame, last frame and number of frames of each reference, per hand
+        self.ends = {}
+        for hand in ("lh", "rh"):
+            offsets = getattr(reference_signs, f"{hand}_offsets")
+            first, last = end_frames(getattr(reference_signs, f"{hand}_embeddings"), offsets)
+            self.ends[hand] = (first, last, np.diff(offsets))
+
+    @staticmethod
+    def _hands(recorded_sign: SignModel):
+        """
+        :return: (hand prefix, query) of each hand used by the sign
+        """
+        hands = []
+        if recorded_sign.has_left_hand:
+            hands.append(("lh", recorded_sign.lh_embedding))
+        if recorded_sign.has_right_hand:
+            hands.append(("rh", recorded_sign.rh_embedding))
+        return hands
+
+    def _dtw(self, hands, store, row: int, max_distance: float):
+        distance = 0
+        for hand, query in hands:
+            length = getattr(store, f"{hand}_lengths")[row]
+            distance += batch_dtw(
+                query,
+                getattr(store, f"{hand}_embeddings")[row : row + 1, : max(length, 1)],
+                np.array([length]),
+                max_distance=max_distance - distance,
+                **self.band_kwargs,
+            )[0]
+            if distance > max_distance:
+                return np.inf
+        return distance
+
+    def distances(self, recorded_sign: SignModel) -> np.ndarray:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: array of the distances to each reference sign, in the order of the
+                 references. Only the k nearest signs have their DTW distance,
+                 the others are set to np.inf
+        """
+        distances = np.full(len(self.reference_signs), np.inf)
+
+        partitions = self.reference_signs.partitions(
+            recorded_sign, self.max_length_ratio
+        )
+        hands = self._hands(recorded_sign)
+        if not partitions or not hands:
+            return distances
+
+        # Position, partition and row in the partition of each candidate, sorted by
+        # position so the ties are broken as with the other matchers
+        candidates = np.concatenate([positions for positions, _ in partitions])
+        partition_ids = np.concatenate(
+            [np.full(len(positions), idx) for idx, (positions, _) in enumerate(partitions)]
+        )
+        rows = np.concatenate([np.arange(len(positions)) for positions, _ in partitions])
+        order = np.argsort(candidates, kind="stable")
+        candidates, partition_ids, rows = (
+            candidates[order],
+            partition_ids[order],
+            rows[order],
+        )
+
+        # Max-heap (negative distances) of the k nearest references found so far
+        heap = []
+
+        def kth_best():
+            return -heap[0][0] if len(heap) == self.k else np.inf
+
+        def visit(position):
+            store = partitions[partition_ids[position]][1]
+            distance = self._dtw(hands, store, rows[position], kth_best())
+            if distance == np.inf:
+                return
+            reference = candidates[position]
+            if len(heap) < self.k:
+                heapq.heappush(heap, (-distance, reference))
+            elif distance < kth_best():
+                heapq.heapreplace(heap, (-distance, reference))
+
+        # 1. LB_Kim
+        lower_bounds = np.zeros(len(candidates))
+        for hand, query in hands:
+            first, last, lengths = self.ends[hand]
+            lower_bounds += lb_kim_ends(
+                query, first[candidates], last[candidates], lengths[candidates]
+            )
+        order = np.argsort(lower_bounds, kind="stable")
+        for position in order[: self.k]:
+            visit(position)
+        remaining = order[self.k :]
+        remaining = remaining[lower_bounds[remaining] <= kth_best()]
+
+        # 2. LB_Keogh, partition by partition
+        if len(remaining) > 0:
+            for idx, (_, store) in enumerate(partitions):
+                survivors = remaining[partition_ids[remaining] == idx]
+                if len(survivors) == 0:
+                    continue
+                keogh = sum(
+                    lb_keogh(
+                        query,
+                        getattr(store, f"{hand}_embeddings")[rows[survivors]],
+                        getattr(store, f"{hand}_lengths")[rows[survivors]],
+                        **self.band_kwargs,
+                    )
+                    for hand, query in hands
+                )
+                lower_bounds[survivors] = np.maximum(lower_bounds[survivors], keogh)
+            remaining = remaining[np.argsort(lower_bounds[remaining], kind="stable")]
+
+        # 3. DTW with early abandoning
+        for position in remaining:
+            if lower_bounds[position] > kth_best():
+                break
+            visit(position)
+
+        for negative_distance, reference in heap:
+            distances[reference] = -negative_distance
+        return distances
+
+    def __call__(self, recorded_sign: SignModel) -> ReferenceIndex:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: Return the ReferenceIndex with the distances from the recorded sign,
+                 same as dtw_distances (only the k first rows are finite)
+        """
+        self.reference_signs.distances[:] = self.distances(recorded_sign)
+        return self.reference_signs
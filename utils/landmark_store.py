@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+LANDMARK_STORE_FOLDER = os.path.join("data", "landmarks")
+DATASET_FOLDER = os.path.join("data", "dataset")
+
+# Number of values per frame of each channel (nb_keypoints * 3)
+CHANNELS = {"pose": 33 * 3, "left_hand": 21 * 3, "right_hand": 21 * 3}
+
+# Channel selections: the signs are only recognized from the hands, the pose is
+# kept for the deployments using it
+HAND_CHANNELS = ("left_hand", "right_hand")
+ALL_CHANNELS = tuple(CHANNELS)
+
+# Prefix of the pickles of each channel in the old data/dataset layout
+PICKLE_PREFIXES = {"pose": "pose_", "left_hand": "lh_", "right_hand": "rh_"}
+
+# Fraction of the frames of the channel files no longer referenced by the index
+# (clips extracted again) above which load_dataset compacts the store
+MAX_ORPHANED_FRACTION = 0.25
+
+
+class LandmarkStore(object):
+    """
+    Landmarks of all the clips of the dataset, packed in one float32 file per channel:
+
+        data/landmarks/index.json       channels, [[sign, video, offset, length, fps], ...]
+        data/landmarks/<channel>.f32    frames of all the clips, shape (n_frames, dim)
+
+    Only the channels selected when the store was created are written
+    The frames of a clip are rows offset:offset + length of every channel file,
+    which are read with np.memmap so loading a clip copies nothing. fps is the
+    effective frame rate of the clip (None if unknown, e.g. migrated clips)
+    """
+
+    def __init__(self, folder=LANDMARK_STORE_FOLDER, channels=None):
+        """
+        :param folder: folder of the store, created on the first append
+        :param channels: channels of a new store (ALL_CHANNELS by default), or channels
+                         required from an existing one
+        """
+        self.folder = folder
+        self.channels = ALL_CHANNELS if channels is None else tuple(channels)
+        self.entries = {}
+        self.n_frames = 0
+        self._memmaps = {}
+
+        unknown = set(self.channels) - set(CHANNELS)
+        if not self.channels or unknown:
+            raise ValueError(f"Unknown landmark channels: {sorted(unknown)}")
+
+        index_path = os.path.join(folder, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path) as file:
+                index = json.load(file)
+            # The first indexes did not record the channels, they had all of them
+            stored_channels = tuple(index.get("channels", ALL_CHANNELS))
+            missing = set(self.channels) - set(stored_channels)
+            if channels is not None and missing:
+                raise ValueError(
+                    f"The landmark store {folder} has no {sorted(missing)} channels, "
+                    "extract the videos again in another folder"
+                )
+            self.channels = stored_channels
+            self.n_frames = index["n_frames"]
+            for clip in index["clips"]:
+                sign_name, video_name, offset, length = clip[:4]
+                # The first indexes did not record the fps
+                fps = clip[4] if len(clip) > 4 else None
+                self.entries[video_name] = (sign_name, offset, length, fps)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, video_name):
+        return video_name in self.entries
+
+    @property
+    def videos(self) -> List[str]:
+        return list(self.entries)
+
+    @property
+    def orphaned_frames(self) -> int:
+        """Frames of the channel files left by the clips which were appended again"""
+        return self.n_frames - sum(length for _, _, length, _ in self.entries.values())
+
+    def get(self, video_name: str) -> Dict[str, np.ndarray]:
+        """
+        :param video_name: name of a clip of the store
+        :return: dictionary channel -> read-only array of shape (length, dim),
+                 for the channels of the store
+        """
+        _, offset, length, _ = self.entries[video_name]
+        return {
+            channel: self._channel(channel)[offset : offset + length]
+            for channel in self.channels
+        }
+
+    def fps(self, video_name: str) -> Optional[float]:
+        """
+        :return: effective frame rate of the clip, None if unknown
+        """
+        return self.entries[video_name][3]
+
+    def append(self, video_name: str, landmark_list: Dict[str, list]):
+        """
+        Add a clip at the end of the channel files. A clip already in the store is
+        appended again and its entry points to the new frames
+
+        :param video_name: name of the clip, <sign>-<id>
+        :param landmark_list: dictionary channel -> list of the landmarks of each frame,
+                              and optionally "fps"
+        """
+        with self.open_clip(video_name) as writer:
+            writer.write(landmark_list)
+            writer.fps = landmark_list.get("fps")
+
+    def open_clip(self, video_name: str) -> "ClipWriter":
+        """
+        :param video_name: name of the clip, <sign>-<id>
+        :return: ClipWriter streaming the frames of the clip at the end of the
+                 channel files, only one clip can be written at a time
+        """
+        return ClipWriter(self, video_name)
+
+    def copy_clip(self, source: "LandmarkStore", video_name: str, chunk_size=1024):
+        """
+        Append a clip of another store, chunk_size frames at a time
+        """
+        landmarks = source.get(video_name)
+        _, _, length, _ = source.entries[video_name]
+        with self.open_clip(video_name) as writer:
+            for start in range(0, length, chunk_size):
+                writer.write(
+                    {
+                        channel: array[start : start + chunk_size]
+                        for channel, array in landmarks.items()
+                    }
+                )
+            writer.fps = source.fps(video_name)
+
+    def migrate(self, dataset_folder=DATASET_FOLDER) -> int:
+        """
+        Append the clips of the old layout (pose_, lh_ and rh_ pickles under
+        data/dataset/<sign>/<video>/) which are not in the store yet
+
+        :return: number of clips added
+        """
+        # Imported here as landmark_utils imports mediapipe and cv2
+        from utils.landmark_utils import load_array
+
+        n = 0
+        for root, dirs, files in sorted(os.walk(dataset_folder)):
+            for file_name in sorted(files):
+                if not (file_name.startswith("pose_") and file_name.endswith(".pickle")):
+                    continue
+                video_name = file_name.replace(".pickle", "").replace("pose_", "")
+                if video_name in self:
+                    continue
+                landmark_list = {}
+                for channel in self.channels:
+                    file_name = f"{PICKLE_PREFIXES[channel]}{video_name}.pickle"
+                    landmark_list[channel] = load_array(os.path.join(root, file_name))
+                self.append(video_name, landmark_list)
+                n += 1
+        return n
+
+    def compact(self, chunk_size=1024) -> int:
+        """
+        Rewrite the channel files with only the frames of the clips of the index.
+        The clips are copied to a store in <folder>/compact, whose files then replace
+        the ones of this store (the index last)
+
+        :return: number of frames reclaimed
+        """
+        orphaned = self.orphaned_frames
+        if orphaned == 0:
+            return 0
+
+        folder = os.path.join(self.folder, "compact")
+        shutil.rmtree(folder, ignore_errors=True)
+        compacted = LandmarkStore(folder, self.channels)
+        for video_name in self.videos:
+            compacted.copy_clip(self, video_name, chunk_size)
+
+        self._memmaps = {}
+        for channel in self.channels:
+            os.replace(compacted._channel_path(channel), self._channel_path(channel))
+        os.replace(os.path.join(folder, "index.json"), os.path.join(self.folder, "index.json"))
+        shutil.rmtree(folder)
+
+        self.entries = compacted.entries
+        self.n_frames = compacted.n_frames
+        return orphaned
+
+    def _channel_path(self, channel: str) -> str:
+        return os.path.join(self.folder, f"{channel}.f32")
+
+    def _channel(self, channel: str) -> np.ndarray:
+        if channel not in self._memmaps:
+            shape = (self.n_frames, CHANNELS[channel])
+            if self.n_frames == 0:
+                # np.memmap cannot map an empty file
+                self._memmaps[channel] = np.zeros(shape, dtype=np.float32)
+            else:
+                self._memmaps[channel] = np.memmap(
+                    self._channel_path(channel), dtype=np.float32, mode="r", shape=shape
+                )
+        return self._memmaps[channel]
+
+    def _save_index(self):
+        index = {
+            "channels": list(self.channels),
+            "n_frames": self.n_frames,
+            "clips": [
+                [sign_name, video_name, offset, length, fps]
+                for video_name, (sign_name, offset, length, fps) in self.entries.items()
+            ],
+        }
+        # Written aside then renamed, so an interrupted append keeps the old index
+        path = os.path.join(self.folder, "index.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(path + ".tmp", path)
+
+
+class ClipWriter(object):
+    """
+    Frames of a clip written at the end of the channel files of a LandmarkStore.
+    The clip is added to the index by close (or at the end of a with block without
+    error), until then it is invisible and the next writer overwrites it
+    """
+
+    def __init__(self, store: LandmarkStore, video_name: str):
+        self.store = store
+        self.video_name = video_name
+        self.length = 0
+        # Effective frame rate of the clip, saved in the index
+        self.fps = None
+
+        os.makedirs(store.folder, exist_ok=True)
+        store._memmaps = {}
+        self._files = {}
+        for channel in store.channels:
+            dim = CHANNELS[channel]
+            path = store._channel_path(channel)
+            file = open(path, "r+b" if os.path.exists(path) else "wb")
+            # Bytes past the index are left by an interrupted append
+            file.seek(store.n_frames * dim * 4)
+            file.truncate()
+            self._files[channel] = file
+
+    def write(self, chunk: Dict[str, list]):
+        """
+        :param chunk: dictionary channel -> landmarks of the next frames, the channels
+                      which are not in the store are ignored
+        """
+        arrays = {
+            channel: np.asarray(chunk[channel], dtype=np.float32).reshape(
+                (-1, CHANNELS[channel])
+            )
+            for channel in self.store.channels
+        }
+        for channel, array in arrays.items():
+            self._files[channel].write(array.tobytes())
+        self.length += len(next(iter(arrays.values())))
+
+    def close(self, commit=True):
+        """
+        :param commit: add the clip to the index of the store, otherwise it is dropped
+        """
+        if not self._files:
+            return
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        if not commit:
+            return
+
+        store = self.store
+        store.entries[self.video_name] = (
+            self.video_name.split("-")[0],
+            store.n_frames,
+            self.length,
+            self.fps,
+        )
+        store.n_frames += self.length
+        store._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
@@ -1,11 +1,24 @@
 import cv2
+import json
 import os
+import queue
+import subprocess
+import threading
 import numpy as np
 import pickle as pkl
 import mediapipe as mp
+from utils.landmark_store import ALL_CHANNELS
 from utils.mediapipe_utils import mediapipe_detection
 
 
+# Attribute of the mediapipe results and number of keypoints of each channel
+CHANNEL_LANDMARKS = {
+    "pose": ("pose_landmarks", 33),
+    "left_hand": ("left_hand_landmarks", 21),
+    "right_hand": ("right_hand_landmarks", 21),
+}
+
+
 def landmark_to_array(mp_landmark_list, num_points):
     """Return a np array of size (nb_keypoints x 3)"""
     if mp_landmark_list is None:
@@ -26,53 +39,302 @@ def extract_landmarks(results):
     return pose, left_hand, right_hand
 
 
+def extract_channels(results, channels=ALL_CHANNELS):
+    """Same as extract_landmarks for the selected channels only, the others are
+    not converted
+
+    :param results: mediapipe object that contains the 3D position of all keypoints
+    :param channels: names of the channels, see utils.landmark_store.CHANNELS
+    :return: dictionary channel -> np array of size nb_keypoints * 3
+    """
+    landmarks = {}
+    for channel in channels:
+        attribute, num_points = CHANNEL_LANDMARKS[channel]
+        landmarks[channel] = landmark_to_array(
+            getattr(results, attribute), num_points
+        ).reshape(num_points * 3)
+    return landmarks
+
 
-def save_landmarks_from_video(video_name):
-    landmark_list = {"pose": [], "left_hand": [], "right_hand": []}
-    sign_name = video_name.split("-")[0]
 
-    # Set the Video stream
+def save_landmarks_from_video(
+    video_name,
+    store,
+    holistic=None,
+    target_fps=None,
+    max_resolution=None,
+    queue_size=32,
+    chunk_size=256,
+):
+    """
+    :param video_name: name of the clip, data/videos/<sign>/<video_name>.mp4
+    :param store: LandmarkStore the landmarks of the clip are appended to, only its
+                  channels are converted and written
+    :param holistic, queue_size, chunk_size: see save_landmarks_from_frames
+    :param target_fps: if given, the frames are decimated to this frame rate,
+                       using their timestamps so clips of any frame rate are sampled alike
+    :param max_resolution: if given, the frames whose longest side is larger are
+                           downscaled to it before the inference
+    """
+    sign_name = video_name.split("-")[0]
     cap = cv2.VideoCapture(
         os.path.join("data", "videos", sign_name, video_name + ".mp4")
     )
-    with mp.solutions.holistic.Holistic(
-        min_detection_confidence=0.5, min_tracking_confidence=0.5
-    ) as holistic:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                # Make detections
-                image, results = mediapipe_detection(frame, holistic)
-
-                # Store results
-                pose, left_hand, right_hand = extract_landmarks(results)
-                landmark_list["pose"].append(pose)
-                landmark_list["left_hand"].append(left_hand)
-                landmark_list["right_hand"].append(right_hand)
-            else:
-                break
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    try:
+        save_landmarks_from_frames(
+            video_name,
+            read_frames(cap, source_fps, target_fps, max_resolution),
+            source_fps if target_fps is None else min(target_fps, source_fps),
+            store,
+            holistic,
+            queue_size,
+            chunk_size,
+        )
+    finally:
         cap.release()
 
-    # Create the folder of the sign if it doesn't exists
-    path = os.path.join("data", "dataset", sign_name)
-    if not os.path.exists(path):
-        os.mkdir(path)
 
-    # Create the folder of the video data if it doesn't exists
-    data_path = os.path.join(path, video_name)
-    if not os.path.exists(data_path):
-        os.mkdir(data_path)
+def save_landmarks_from_frames(
+    video_name, frames, fps, store, holistic=None, queue_size=32, chunk_size=256
+):
+    """
+    Extract the landmarks of a clip with a three stage pipeline: a thread decoding the
+    frames, the inference in the calling thread, and a thread writing the landmarks
+    to the store by chunks. The stages are linked by bounded queues, so the memory
+    used depends on queue_size and chunk_size, not on the length of the clip
 
-    # Saving the landmark_list in the correct folder
-    save_array(
-        landmark_list["pose"], os.path.join(data_path, f"pose_{video_name}.pickle")
-    )
-    save_array(
-        landmark_list["left_hand"], os.path.join(data_path, f"lh_{video_name}.pickle")
-    )
-    save_array(
-        landmark_list["right_hand"], os.path.join(data_path, f"rh_{video_name}.pickle")
-    )
+    :param video_name: name of the clip, <sign>-<id>
+    :param frames: iterable of the BGR frames of the clip, e.g. read_frames or
+                   stream_clip
+    :param fps: effective frame rate of the frames, saved in the store
+    :param store: LandmarkStore the landmarks of the clip are appended to
+    :param holistic: optional mediapipe Holistic reused across videos, it is reset
+                     first so the output is the same as with a fresh one
+    :param queue_size: maximum number of frames waiting in each queue
+    :param chunk_size: number of frames written to the store at once
+    """
+    if holistic is None:
+        with mp.solutions.holistic.Holistic(
+            min_detection_confidence=0.5, min_tracking_confidence=0.5
+        ) as holistic:
+            return save_landmarks_from_frames(
+                video_name, frames, fps, store, holistic, queue_size, chunk_size
+            )
+
+    # Forget the tracking state of the previous video
+    holistic.reset()
+
+    with store.open_clip(video_name) as writer:
+        run_extraction_pipeline(frames, holistic, writer, queue_size, chunk_size)
+        writer.fps = fps
+
+
+def read_frames(cap, source_fps, target_fps=None, max_resolution=None):
+    """
+    :param cap: cv2.VideoCapture of the clip
+    :param source_fps: frame rate of the clip, used when the frames have no timestamp
+    :param target_fps, max_resolution: see save_landmarks_from_video
+    :return: generator of the frames to send to Holistic
+    """
+    frame_idx, next_timestamp = 0, 0.0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        # Timestamp of the frame, from its index if the container has none
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if timestamp <= 0 and frame_idx > 0:
+            timestamp = frame_idx / source_fps
+        frame_idx += 1
+        if target_fps is not None:
+            if timestamp + 1e-6 < next_timestamp:
+                continue
+            next_timestamp += 1 / target_fps
+        if max_resolution is not None:
+            frame = downscale(frame, max_resolution)
+        yield frame
+
+
+def downscale(frame, max_resolution):
+    """Resize the frame so that its longest side is at most max_resolution pixels"""
+    height, width = frame.shape[:2]
+    scale = max_resolution / max(height, width)
+    if scale >= 1:
+        return frame
+    size = (max(round(width * scale), 1), max(round(height * scale), 1))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def probe_video(source):
+    """
+    :param source: path of a video file
+    :return: width, height and frame rate of its first video stream, from ffprobe
+    """
+    output = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=width,height,avg_frame_rate",
+            "-of",
+            "json",
+            source,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    stream = json.loads(output)["streams"][0]
+    numerator, _, denominator = stream["avg_frame_rate"].partition("/")
+    fps = float(numerator) / float(denominator or 1) if float(numerator) else 30.0
+    return int(stream["width"]), int(stream["height"]), fps
+
+
+def stream_clip(
+    source,
+    start_time=None,
+    duration_time=None,
+    target_fps=None,
+    max_resolution=None,
+    clip_file=None,
+):
+    """
+    Decode a window of a video with ffmpeg and read its raw frames from the pipe,
+    without writing nor decoding again a clip file
+
+    :param source: path of the source video
+    :param start_time, duration_time: window of the clip (hh:mm:ss.ms), None for the
+                                      start / end of the video
+    :param target_fps, max_resolution: see save_landmarks_from_video, done by ffmpeg
+    :param clip_file: if given, the clip is also saved there (stream copy, same
+                      command as yt_download.py), by the same ffmpeg process
+    :return: generator of the BGR frames, effective frame rate of the frames
+    """
+    width, height, source_fps = probe_video(source)
+    filters = []
+    # Only decimated, as read_frames, the fps filter would duplicate frames to upsample
+    if target_fps is not None and target_fps < source_fps:
+        filters.append(f"fps={target_fps}")
+    if max_resolution is not None and max(width, height) > max_resolution:
+        scale = max_resolution / max(width, height)
+        width, height = max(round(width * scale), 1), max(round(height * scale), 1)
+        filters.append(f"scale={width}:{height}:flags=area")
+
+    window = [] if duration_time is None else ["-to", str(duration_time)]
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if start_time is not None:
+        command += ["-ss", str(start_time)]
+    command += ["-i", source]
+    if clip_file is not None:
+        command += window + ["-c", "copy", "-y", clip_file]
+    command += window + (["-vf", ",".join(filters)] if filters else [])
+    command += ["-an", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+
+    def frames():
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        frame_size = width * height * 3
+        try:
+            while True:
+                buffer = process.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                yield np.frombuffer(buffer, dtype=np.uint8).reshape((height, width, 3))
+        finally:
+            # Stopped before the end of the clip
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors="replace")
+            process.stderr.close()
+            if process.wait() > 0:
+                raise RuntimeError(f"ffmpeg failed on {source}: {stderr.strip()}")
+
+    fps = source_fps if target_fps is None else min(target_fps, source_fps)
+    return frames(), fps
+
+
+# Marks the end of the stream in the queues of the pipeline
+_END = object()
+
+
+def run_extraction_pipeline(frames, holistic, writer, queue_size=32, chunk_size=256):
+    """
+    :param frames: iterable of BGR frames, consumed by the decode thread
+    :param holistic: mediapipe Holistic, run in the calling thread
+    :param writer: ClipWriter receiving the landmarks of the channels of its store,
+                   from the writer thread
+    :param queue_size, chunk_size: see save_landmarks_from_video
+    """
+    frame_queue = queue.Queue(maxsize=queue_size)
+    landmark_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    channels = writer.store.channels
+
+    def decode():
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    break
+                frame_queue.put(frame)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            frame_queue.put(_END)
+
+    def write():
+        chunk, n_frames = {channel: [] for channel in channels}, 0
+        while True:
+            landmarks = landmark_queue.get()
+            if landmarks is not _END:
+                for channel in channels:
+                    chunk[channel].append(landmarks[channel])
+                n_frames += 1
+            if n_frames and (landmarks is _END or n_frames == chunk_size):
+                # After an error the landmarks are still consumed, but dropped
+                if not errors:
+                    try:
+                        writer.write(chunk)
+                    except Exception as error:
+                        errors.append(error)
+                chunk, n_frames = {channel: [] for channel in channels}, 0
+            if landmarks is _END:
+                break
+
+    decode_thread = threading.Thread(target=decode, daemon=True)
+    write_thread = threading.Thread(target=write, daemon=True)
+    decode_thread.start()
+    write_thread.start()
+
+    try:
+        while True:
+            frame = frame_queue.get()
+            if frame is _END:
+                break
+            if errors:
+                continue
+            _, results = mediapipe_detection(frame, holistic)
+            landmark_queue.put(extract_channels(results, channels))
+    except BaseException:
+        # Unblock the decode thread before leaving
+        stop.set()
+        while frame_queue.get() is not _END:
+            pass
+        raise
+    finally:
+        landmark_queue.put(_END)
+        decode_thread.join()
+        write_thread.join()
+
+    if errors:
+        raise errors[0]
 
 
 def save_array(arr, path):
@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.dtw import batch_dtw
+from utils.reference_index import ReferenceIndex
+from utils.reference_store import ReferenceStore
+
+
+# ReferenceIndex of the worker process (packed arrays only), set once by _init_worker
+_worker_index = None
+
+
+def _init_worker(reference_signs: ReferenceIndex):
+    global _worker_index
+    _worker_index = reference_signs
+
+
+def _match_store(store: ReferenceStore, recorded_sign: SignModel, band_kwargs) -> np.ndarray:
+    """
+    :return: DTW distances between the recorded sign and all the references of
+             the store, which must use the same hands as the recorded sign
+    """
+    distances = np.zeros(len(store))
+    if recorded_sign.has_left_hand:
+        distances += batch_dtw(
+            recorded_sign.lh_embedding,
+            store.lh_embeddings,
+            store.lh_lengths,
+            **band_kwargs,
+        )
+    if recorded_sign.has_right_hand:
+        distances += batch_dtw(
+            recorded_sign.rh_embedding,
+            store.rh_embeddings,
+            store.rh_lengths,
+            **band_kwargs,
+        )
+    return distances
+
+
+def _match_chunk(recorded_sign: SignModel, positions: np.ndarray, band_kwargs):
+    """
+    Only the frames of the given references are padded, in the worker process
+    """
+    store = ReferenceStore([_worker_index.sign_model(idx) for idx in positions])
+    return _match_store(store, recorded_sign, band_kwargs)
+
+
+class ParallelMatcher(object):
+    """
+    Spread the DTW comparisons with the reference signs over a persistent process
+    pool. The workers receive the reference embeddings once, when they start, and
+    then only the recorded sign and the indices of the references to compare
+
+    Call close() (or use it as a context manager) to stop the workers
+    """
+
+    def __init__(
+        self,
+        reference_signs: ReferenceIndex,
+        n_workers=None,
+        min_parallel_references=64,
+        band=None,
+        band_width=10,
+        max_slope=2.0,
+        max_length_ratio=None,
+    ):
+        """
+        :param reference_signs: ReferenceIndex (see utils.dtw.dtw_distances)
+        :param n_workers: number of worker processes, os.cpu_count() - 1 by default
+                          (one core is left to the camera thread)
+        :param min_parallel_references: below this number of compatible references
+                                        the matching runs serially in the calling
+                                        process, where IPC overhead would dominate
+        :param band, band_width, max_slope: global constraint, see utils.dtw.batch_dtw
+        :param max_length_ratio: optional length cutoff, see ReferenceIndex.partitions
+        """
+        self.reference_signs = reference_signs
+        self.n_workers = n_workers or max((os.cpu_count() or 2) - 1, 1)
+        self.min_parallel_references = min_parallel_references
+        self.band_kwargs = dict(band=band, band_width=band_width, max_slope=max_slope)
+        self.max_length_ratio = max_length_ratio
+
+        self.pool = None
+        if self.n_workers > 1 and len(reference_signs) >= min_parallel_references:
+            # Spawned, not forked: the camera, Tk and mediapipe threads are running
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(reference_signs,),
+            )
+
+    def distances(self, recorded_sign: SignModel) -> np.ndarray:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: array of the distances to each reference sign, in the order of the
+                 references (np.inf if the hands used do not match)
+        """
+        distances = np.full(len(self.reference_signs), np.inf)
+
+        partitions = self.reference_signs.partitions(
+            recorded_sign, self.max_length_ratio
+        )
+        n_candidates = sum(len(positions) for positions, _ in partitions)
+        if n_candidates == 0:
+            return distances
+
+        if self.pool is None or n_candidates < self.min_parallel_references:
+            for positions, store in partitions:
+                distances[positions] = _match_store(store, recorded_sign, self.band_kwargs)
+            return distances
+
+        # Sorted by length so that each chunk is padded to similar lengths
+        candidates = np.concatenate([positions for positions, _ in partitions])
+        candidates = candidates[
+            np.argsort(self.reference_signs.n_frames[candidates], kind="stable")
+        ]
+        chunks = [
+            chunk for chunk in np.array_split(candidates, self.n_workers) if len(chunk) > 0
+        ]
+        futures = [
+            self.pool.submit(_match_chunk, recorded_sign, chunk, self.band_kwargs)
+            for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            distances[chunk] = future.result()
+        return distances
+
+    def __call__(self, recorded_sign: SignModel) -> ReferenceIndex:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: Return the ReferenceIndex with the distances from the recorded sign,
+                 same as dtw_distances
+        """
+        self.reference_signs.distances[:] = self.distances(recorded_sign)
+        return self.reference_signs
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
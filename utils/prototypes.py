@@ -0,0 +1,175 @@
+import os
+from typing import List
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.dtw import batch_dtw, dtw_path
+from utils.reference_index import ReferenceIndex
+from utils.reference_store import ReferenceStore
+
+
+PROTOTYPES_FOLDER = os.path.join("data", "prototypes")
+PROTOTYPE_METHODS = ("medoid", "dba")
+
+
+def distance_matrix(sign_models: List[SignModel]) -> np.ndarray:
+    """
+    :param sign_models: SignModels using the same hands
+    :return: symmetric matrix of the exact DTW distances between all the sign models
+    """
+    store = ReferenceStore(sign_models)
+    distances = np.zeros((len(sign_models), len(sign_models)))
+    for idx, sign_model in enumerate(sign_models):
+        if sign_model.has_left_hand:
+            distances[idx] += batch_dtw(
+                sign_model.lh_embedding, store.lh_embeddings, store.lh_lengths
+            )
+        if sign_model.has_right_hand:
+            distances[idx] += batch_dtw(
+                sign_model.rh_embedding, store.rh_embeddings, store.rh_lengths
+            )
+    return np.minimum(distances, distances.T)
+
+
+def k_medoids(distances: np.ndarray, n_clusters: int, n_iterations=20) -> np.ndarray:
+    """
+    :param distances: distance matrix of shape (n, n)
+    :param n_clusters: number of medoids (clipped to n)
+    :return: indices of the medoids
+    """
+    n_clusters = min(n_clusters, len(distances))
+
+    # Start with the global medoid then the farthest points, fewer medoids are
+    # returned when the remaining points are duplicates of the medoids
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < n_clusters:
+        nearest = distances[:, medoids].min(axis=1)
+        if nearest.max() <= 0:
+            break
+        medoids.append(int(np.argmax(nearest)))
+    medoids = np.array(medoids)
+    n_clusters = len(medoids)
+
+    for _ in range(n_iterations):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = medoids.copy()
+        for cluster in range(n_clusters):
+            members = np.flatnonzero(labels == cluster)
+            if len(members) == 0:
+                # Keep the previous medoid of an empty cluster
+                continue
+            within = distances[np.ix_(members, members)].sum(axis=1)
+            new_medoids[cluster] = members[np.argmin(within)]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+    return medoids
+
+
+def dba(sequences: List[np.ndarray], initial: np.ndarray, n_iterations=10) -> np.ndarray:
+    """
+    DTW Barycenter Averaging: each frame of the average is replaced by the
+    barycenter of the frames aligned with it by DTW. The DTW uses the L1 metric,
+    whose barycenter is the per-feature median
+
+    :param sequences: list of arrays of shape (n_frame, nb_features)
+    :param initial: starting average, usually the medoid of the sequences
+    :return: the average sequence, with the length of initial
+    """
+    average = np.array(initial, dtype=np.float64)
+    previous_cost = np.inf
+    for _ in range(n_iterations):
+        aligned = [[] for _ in range(len(average))]
+        cost = 0
+        for sequence in sequences:
+            distance, path = dtw_path(average, sequence)
+            cost += distance
+            for i, j in path:
+                aligned[i].append(sequence[j])
+        average = np.array([np.median(frames, axis=0) for frames in aligned])
+        if cost >= previous_cost:
+            break
+        previous_cost = cost
+    return average.astype(np.float32)
+
+
+def build_prototypes(
+    reference_signs: ReferenceIndex, n_prototypes=1, method="medoid"
+) -> ReferenceIndex:
+    """
+    Replace the clips of each sign by a few prototype sequences. The clips are
+    grouped by sign name and hands used, each group is split in n_prototypes
+    clusters (k-medoids on the DTW distances) and each cluster gives one prototype:
+    its medoid, or the DBA average of its clips initialized with the medoid
+
+    :param reference_signs: ReferenceIndex of the reference signs
+    :param n_prototypes: maximum number of prototypes per sign and hands used
+    :param method: "medoid" or "dba"
+    :return: ReferenceIndex with one reference per prototype
+    """
+    if method not in PROTOTYPE_METHODS:
+        raise ValueError(f"Unknown prototype method: {method}")
+
+    names, prototypes = [], []
+    groups = np.stack(
+        [
+            reference_signs.name_codes,
+            reference_signs.has_left_hand,
+            reference_signs.has_right_hand,
+        ],
+        axis=1,
+    )
+    for group in np.unique(groups, axis=0):
+        positions = np.flatnonzero(np.all(groups == group, axis=1))
+        members = [reference_signs.sign_model(idx) for idx in positions]
+        distances = distance_matrix(members)
+        medoids = k_medoids(distances, n_prototypes)
+        labels = np.argmin(distances[:, medoids], axis=1)
+
+        for cluster, medoid in enumerate(medoids):
+            prototype = members[medoid]
+            if method == "dba" and np.any(labels == cluster):
+                cluster_members = [members[i] for i in np.flatnonzero(labels == cluster)]
+                arrays = prototype.to_arrays()
+                for hand in ("lh", "rh"):
+                    if getattr(prototype, f"n_{hand}_frames") > 0:
+                        arrays[f"{hand}_embedding"] = dba(
+                            [getattr(m, f"{hand}_embedding") for m in cluster_members],
+                            getattr(prototype, f"{hand}_embedding"),
+                        )
+                prototype = SignModel.from_arrays(arrays)
+
+            names.append(reference_signs.sign_names[group[0]])
+            prototypes.append(prototype)
+
+    return ReferenceIndex(names, prototypes)
+
+
+def save_prototypes(prototypes: ReferenceIndex, folder=PROTOTYPES_FOLDER):
+    """
+    Save each prototype as data/prototypes/<sign>/<sign>-<idx>.npz
+    """
+    for code, name in enumerate(prototypes.sign_names):
+        path = os.path.join(folder, name)
+        os.makedirs(path, exist_ok=True)
+        for file_name in os.listdir(path):
+            if file_name.endswith(".npz"):
+                os.remove(os.path.join(path, file_name))
+        positions = np.flatnonzero(prototypes.name_codes == code)
+        for idx, position in enumerate(positions):
+            prototypes.sign_model(position).save(os.path.join(path, f"{name}-{idx}.npz"))
+
+
+def load_prototypes(folder=PROTOTYPES_FOLDER) -> ReferenceIndex:
+    """
+    :return: ReferenceIndex of the prototypes saved by save_prototypes
+    """
+    names, prototypes = [], []
+    for sign_name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, sign_name)
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".npz"):
+                names.append(sign_name)
+                prototypes.append(SignModel.load(os.path.join(path, file_name)))
+    return ReferenceIndex(names, prototypes)
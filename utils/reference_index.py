@@ -0,0 +1,204 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.reference_store import ReferenceStore
+
+
+class ReferenceIndex(object):
+    """
+    Columnar store of the reference signs: names, embeddings and distances
+
+    Args
+        sign_names: ndarray of str; distinct sign names
+        name_codes: ndarray of int, shape (n_references,); index of the name of each
+                    reference in sign_names
+        has_x_hand: ndarray of bool, shape (n_references,)
+        xh_embeddings: float32 ndarray of shape (total_n_frame, nb_features); the
+                       embeddings of all the references one after the other
+        xh_offsets: ndarray of int, shape (n_references + 1,); the frames of the
+                    reference idx are xh_embeddings[xh_offsets[idx]:xh_offsets[idx + 1]]
+        distances: float64 ndarray of shape (n_references,); distances to the last
+                   recorded sign, in the order of the references
+
+    The references are also partitioned by hands used and by length bucket
+    (see partitions), so a query only touches the references it can match
+    """
+
+    def __init__(self, names: List[str], sign_models: List[SignModel]):
+        self.sign_names, self.name_codes = np.unique(
+            np.asarray(names, dtype=str), return_inverse=True
+        )
+        self.has_left_hand = np.array([m.has_left_hand for m in sign_models], dtype=bool)
+        self.has_right_hand = np.array(
+            [m.has_right_hand for m in sign_models], dtype=bool
+        )
+        self.compact = np.array([m.compact for m in sign_models], dtype=bool)
+
+        self.lh_embeddings, self.lh_offsets = self._pack(
+            [m.lh_embedding for m in sign_models]
+        )
+        self.rh_embeddings, self.rh_offsets = self._pack(
+            [m.rh_embedding for m in sign_models]
+        )
+
+        self.distances = np.zeros(len(sign_models))
+        self._reference_store = None
+        self._partitions = None
+
+    def __len__(self):
+        return len(self.name_codes)
+
+    def __getstate__(self):
+        # The padded stores are rebuilt on first use, only the packed arrays are pickled
+        state = self.__dict__.copy()
+        state["_reference_store"] = state["_partitions"] = None
+        return state
+
+    @staticmethod
+    def _pack(embeddings: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        offsets = np.zeros(len(embeddings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(embedding) for embedding in embeddings])
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32), offsets
+        return np.ascontiguousarray(np.concatenate(embeddings), dtype=np.float32), offsets
+
+    @property
+    def n_frames(self) -> np.ndarray:
+        """Number of frames of each reference, the longest of its two hands"""
+        return np.maximum(np.diff(self.lh_offsets), np.diff(self.rh_offsets))
+
+    @property
+    def names(self) -> np.ndarray:
+        """Sign name of each reference"""
+        return self.sign_names[self.name_codes]
+
+    def sign_model(self, idx: int) -> SignModel:
+        """
+        :return: SignModel of the reference idx, its embeddings are views of the
+                 packed arrays
+        """
+        return SignModel.from_arrays(
+            {
+                "has_hands": np.array([self.has_left_hand[idx], self.has_right_hand[idx]]),
+                "compact": self.compact[idx],
+                "lh_embedding": self.lh_embeddings[
+                    self.lh_offsets[idx] : self.lh_offsets[idx + 1]
+                ],
+                "rh_embedding": self.rh_embeddings[
+                    self.rh_offsets[idx] : self.rh_offsets[idx + 1]
+                ],
+            }
+        )
+
+    def sign_models(self) -> List[SignModel]:
+        return [self.sign_model(idx) for idx in range(len(self))]
+
+    @property
+    def reference_store(self) -> ReferenceStore:
+        """Zero-padded tensors of the embeddings, built on first use"""
+        if self._reference_store is None:
+            self._reference_store = ReferenceStore(self.sign_models())
+        return self._reference_store
+
+    def partitions(self, recorded_sign: SignModel, max_length_ratio=None):
+        """
+        References that can be matched with the recorded sign: those using the same
+        hands and, if max_length_ratio is given, whose number of frames is within
+        this ratio of the recorded one (a good alignment is impossible otherwise)
+
+        The partitions are keyed by (has_left_hand, has_right_hand, length bucket),
+        bucket b holding the lengths in [2 ** b, 2 ** (b + 1) - 1] (-1 for empty
+        references), and have their own padded ReferenceStore
+
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :param max_length_ratio: optional cutoff, e.g. 2 keeps lengths in [n / 2, n * 2]
+        :return: list of (positions, ReferenceStore) of the compatible partitions
+        """
+        hands = (recorded_sign.has_left_hand, recorded_sign.has_right_hand)
+        n_frames = max(recorded_sign.n_lh_frames, recorded_sign.n_rh_frames)
+        partitions = []
+        for key, partition in self.all_partitions().items():
+            has_left_hand, has_right_hand, bucket = key
+            if (has_left_hand, has_right_hand) != hands:
+                continue
+            positions, store = partition
+            if max_length_ratio is not None:
+                low, high = n_frames / max_length_ratio, n_frames * max_length_ratio
+                bucket_low = 2 ** bucket if bucket >= 0 else 0
+                if 2 ** (bucket + 1) - 1 < low or bucket_low > high:
+                    continue
+                lengths = self.n_frames[positions]
+                keep = (lengths >= low) & (lengths <= high)
+                if not keep.any():
+                    continue
+                if not keep.all():
+                    positions, store = positions[keep], store.subset(keep)
+            partitions.append((positions, store))
+        return partitions
+
+    def all_partitions(self):
+        """
+        :return: dict {(has_left_hand, has_right_hand, length bucket): (positions,
+                 ReferenceStore)} of every partition, built on first use (see partitions)
+        """
+        if self._partitions is None:
+            self._partitions = self._build_partitions()
+        return self._partitions
+
+    def candidates(self, recorded_sign: SignModel, max_length_ratio=None) -> np.ndarray:
+        """
+        :return: sorted positions of the references of the compatible partitions
+        """
+        partitions = self.partitions(recorded_sign, max_length_ratio)
+        if not partitions:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([positions for positions, _ in partitions]))
+
+    def _build_partitions(self):
+        buckets = [
+            int(math.log2(n_frames)) if n_frames > 0 else -1 for n_frames in self.n_frames
+        ]
+        keys = list(zip(self.has_left_hand.tolist(), self.has_right_hand.tolist(), buckets))
+
+        partitions = {}
+        for key in sorted(set(keys)):
+            positions = np.array(
+                [idx for idx, other in enumerate(keys) if other == key], dtype=np.int64
+            )
+            store = ReferenceStore([self.sign_model(idx) for idx in positions])
+            partitions[key] = (positions, store)
+        return partitions
+
+    def subset(self, positions) -> "ReferenceIndex":
+        """
+        :param positions: positions (or boolean mask) of the references to keep
+        :return: a new ReferenceIndex with these references, distances reset
+        """
+        positions = np.arange(len(self))[positions]
+        return ReferenceIndex(
+            self.names[positions], [self.sign_model(idx) for idx in positions]
+        )
+
+    def reset_distances(self):
+        self.distances[:] = 0
+
+    def top_k(self, k: int) -> np.ndarray:
+        """
+        :return: positions of the k references with the lowest distances, sorted by
+                 increasing distance. O(n_references) with argpartition
+        """
+        k = min(k, len(self))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        nearest = np.argpartition(self.distances, k - 1)[:k]
+        return nearest[np.argsort(self.distances[nearest], kind="stable")]
+
+    def sign_counts(self) -> Dict[str, int]:
+        """
+        :return: number of references of each sign
+        """
+        counts = np.bincount(self.name_codes, minlength=len(self.sign_names))
+        return dict(zip(self.sign_names.tolist(), counts.tolist()))
@@ -0,0 +1,73 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from models.sign_model import SignModel
+
+
+class ReferenceStore(object):
+    """
+    Reference embeddings stacked into zero-padded tensors so that a recorded
+    sign can be compared to all the references at once
+
+    Args
+        has_x_hand: ndarray of bool, shape (n_references,)
+        xh_embeddings: float32 ndarray of shape (n_references, max_n_frame, nb_features)
+        xh_lengths: ndarray of int, shape (n_references,); number of valid frames
+                    of each reference, the remaining rows are padding
+    """
+
+    def __init__(self, sign_models: List[SignModel]):
+        self.has_left_hand = np.array([m.has_left_hand for m in sign_models], dtype=bool)
+        self.has_right_hand = np.array(
+            [m.has_right_hand for m in sign_models], dtype=bool
+        )
+
+        self.lh_embeddings, self.lh_lengths = self._stack(
+            [m.lh_embedding for m in sign_models]
+        )
+        self.rh_embeddings, self.rh_lengths = self._stack(
+            [m.rh_embedding for m in sign_models]
+        )
+
+    def __len__(self):
+        return len(self.has_left_hand)
+
+    def subset(self, positions) -> "ReferenceStore":
+        """
+        :param positions: positions (or boolean mask) of the references to keep
+        :return: a new ReferenceStore with these references, padded to their own
+                 maximum number of frames
+        """
+        store = ReferenceStore.__new__(ReferenceStore)
+        store.has_left_hand = self.has_left_hand[positions]
+        store.has_right_hand = self.has_right_hand[positions]
+        store.lh_lengths = self.lh_lengths[positions]
+        store.rh_lengths = self.rh_lengths[positions]
+        store.lh_embeddings = self.lh_embeddings[
+            positions, : max(store.lh_lengths.max(initial=0), 1)
+        ]
+        store.rh_embeddings = self.rh_embeddings[
+            positions, : max(store.rh_lengths.max(initial=0), 1)
+        ]
+        return store
+
+    @staticmethod
+    def _stack(embeddings: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Params
+            embeddings: List of arrays of shape (n_frame, nb_features)
+        Return
+            The zero-padded tensor of shape (n_references, max_n_frame, nb_features)
+            and the number of frames of each reference
+        """
+        lengths = np.array([len(embedding) for embedding in embeddings], dtype=np.int64)
+        n_features = embeddings[0].shape[1] if embeddings else 0
+
+        stacked = np.zeros(
+            (len(embeddings), max(lengths.max(initial=0), 1), n_features),
+            dtype=np.float32,
+        )
+        for idx, embedding in enumerate(embeddings):
+            stacked[idx, : len(embedding)] = embedding
+        return stacked, lengths
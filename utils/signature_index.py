@@ -0,0 +1,115 @@
+from typing import List
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.dtw import dtw_distances
+from utils.reference_index import ReferenceIndex
+
+
+def resample(embedding: np.ndarray, n_frames: int) -> np.ndarray:
+    """
+    Linear interpolation of a sequence to a fixed number of frames
+
+    :param embedding: array of shape (n_frame, nb_features)
+    :param n_frames: number of frames of the output
+    :return: array of shape (n_frames, nb_features), zeros if the sequence is empty
+    """
+    if len(embedding) == 0:
+        return np.zeros((n_frames, embedding.shape[1]), dtype=np.float32)
+    if len(embedding) == 1:
+        return np.repeat(embedding, n_frames, axis=0).astype(np.float32)
+
+    position = np.linspace(0, len(embedding) - 1, n_frames)
+    previous = np.floor(position).astype(np.int64)
+    following = np.minimum(previous + 1, len(embedding) - 1)
+    weight = (position - previous)[:, None]
+    return ((1 - weight) * embedding[previous] + weight * embedding[following]).astype(
+        np.float32
+    )
+
+
+def get_signature(sign_model: SignModel, n_frames=8) -> np.ndarray:
+    """
+    :return: fixed-length vector of the sign, both hand embeddings resampled
+             to n_frames and concatenated
+    """
+    return np.concatenate(
+        [
+            resample(sign_model.lh_embedding, n_frames).ravel(),
+            resample(sign_model.rh_embedding, n_frames).ravel(),
+        ]
+    )
+
+
+class SignatureIndex(object):
+    """
+    Exact nearest-neighbour index of the fixed-length signatures of the reference
+    signs. The Euclidean distances of a query to all the references are computed
+    with one matrix-vector product: |q - r|² = |q|² - 2 q.r + |r|²
+    """
+
+    def __init__(self, sign_models: List[SignModel], n_frames=8):
+        self.n_frames = n_frames
+        self.signatures = np.stack(
+            [get_signature(sign_model, n_frames) for sign_model in sign_models]
+        )
+        self.squared_norms = np.einsum("ij,ij->i", self.signatures, self.signatures)
+        self.has_left_hand = np.array([m.has_left_hand for m in sign_models], dtype=bool)
+        self.has_right_hand = np.array(
+            [m.has_right_hand for m in sign_models], dtype=bool
+        )
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def query(self, sign_model: SignModel, n_candidates: int) -> np.ndarray:
+        """
+        :param sign_model: the recorded sign
+        :param n_candidates: number of references to return
+        :return: positions of the nearest references using the same hands as the
+                 recorded sign, sorted by increasing signature distance
+        """
+        signature = get_signature(sign_model, self.n_frames)
+        distances = self.squared_norms - 2 * (self.signatures @ signature)
+
+        compatible = (self.has_left_hand == sign_model.has_left_hand) & (
+            self.has_right_hand == sign_model.has_right_hand
+        )
+        candidates = np.flatnonzero(compatible)
+        if len(candidates) > n_candidates:
+            nearest = np.argpartition(distances[candidates], n_candidates - 1)
+            candidates = candidates[nearest[:n_candidates]]
+        return candidates[np.argsort(distances[candidates], kind="stable")]
+
+
+class SignatureMatcher(object):
+    """
+    Two-stage matching: the SignatureIndex retrieves the n_candidates nearest
+    reference signs, and only those are re-ranked by dtw_distances
+    """
+
+    def __init__(
+        self, reference_signs: ReferenceIndex, n_candidates=32, n_frames=8, **dtw_kwargs
+    ):
+        """
+        :param reference_signs: ReferenceIndex (see utils.dtw.dtw_distances)
+        :param n_candidates: number of reference signs re-ranked by DTW
+        :param n_frames: number of frames of the signatures
+        :param dtw_kwargs: backend and band options passed to dtw_distances
+        """
+        self.reference_signs = reference_signs
+        self.index = SignatureIndex(reference_signs.sign_models(), n_frames)
+        self.n_candidates = n_candidates
+        self.dtw_kwargs = dtw_kwargs
+
+    def __call__(self, recorded_sign: SignModel) -> ReferenceIndex:
+        """
+        :param recorded_sign: a SignModel object containing the data gathered during record
+        :return: Return the ReferenceIndex with the distances from the recorded sign,
+                 same as dtw_distances (np.inf for the signs not retrieved)
+        """
+        candidates = self.index.query(recorded_sign, self.n_candidates)
+        return dtw_distances(
+            recorded_sign, self.reference_signs, positions=candidates, **self.dtw_kwargs
+        )
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class SubsequenceDTW(object):
+    """
+    Open-begin / open-end DTW of a stream against a batch of zero-padded
+    reference sequences (SPRING), updated one stream frame at a time
+
+    The state is the last column of the accumulated cost matrix of every reference:
+    state[r, j] is the cost of the best alignment of the first j frames of the
+    reference r ending at the current stream frame and starting at any stream frame,
+    and starts[r, j] the stream position where this alignment starts.
+    Each update costs O(n_references * max_n_frame * nb_features), whatever the
+    length of the stream
+    """
+
+    def __init__(self, references: np.ndarray, lengths: np.ndarray):
+        """
+        :param references: array of shape (n_references, max_n_frame, nb_features)
+        :param lengths: number of valid frames of each reference
+        """
+        self.references = references
+        self.lengths = np.asarray(lengths)
+        self.state = np.empty((len(references), references.shape[1] + 1))
+        self.starts = np.zeros(self.state.shape, dtype=np.int64)
+        self.position = 0
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Forget the stream, for all the references or only the masked ones
+        """
+        if mask is None:
+            mask = slice(None)
+            self.position = 0
+        self.state[mask, 0] = 0
+        self.state[mask, 1:] = np.inf
+
+    def update(self, frame: np.ndarray, position=None) -> np.ndarray:
+        """
+        :param frame: array of shape (nb_features,), next frame of the stream
+        :param position: position of the frame in the stream, by default the number
+                         of frames given since the last reset
+        :return: array of shape (n_references,), cost of the best alignment of each
+                 whole reference ending at this frame (np.inf for empty references),
+                 its start is in alignment_starts
+        """
+        if position is None:
+            position = self.position
+        self.position = position + 1
+
+        cost = np.abs(self.references - frame).sum(axis=2, dtype=np.float64)
+        cumulative = np.cumsum(cost, axis=1)
+
+        # Same row recurrence as utils.dtw.batch_dtw, state[:, 0] = 0 lets an
+        # alignment start at any stream frame
+        self.starts[:, 0] = position
+        diagonal = self.state[:, :-1] <= self.state[:, 1:]
+        entry = np.where(diagonal, self.state[:, :-1], self.state[:, 1:])
+        entry_starts = np.where(diagonal, self.starts[:, :-1], self.starts[:, 1:])
+
+        # The start of D[i, j] is the one of the entry k <= j reaching the running
+        # minimum, i.e. the last k where the running minimum was updated
+        entry = entry - (cumulative - cost)
+        running_min = np.minimum.accumulate(entry, axis=1)
+        columns = np.arange(entry.shape[1])
+        argmin = np.maximum.accumulate(
+            np.where(entry <= running_min, columns, 0), axis=1
+        )
+        self.state[:, 1:] = cumulative + running_min
+        self.starts[:, 1:] = np.take_along_axis(entry_starts, argmin, axis=1)
+        self.state[:, 0] = 0
+
+        rows = np.arange(len(self.state))
+        self.alignment_starts = self.starts[rows, self.lengths]
+        costs = self.state[rows, self.lengths]
+        costs[self.lengths == 0] = np.inf
+        return costs
@@ -1,128 +1,335 @@
-import re
-import yt_dlp
+"""
+Download the videos of yt_links.csv from YouTube and cut the clips of the signs.
+
+The rows are grouped by YouTube id so each source video is fetched once, and its
+clips are cut by a pool of ffmpeg processes while the next source is fetched.
+The source videos are cached in data/sources (--cache-size MB, least recently used
+first out), so a re-run only fetches the missing ones. With --local-sources, the
+sources are read from <folder>/<id>.mp4 instead of YouTube, to run the script offline.
+
+With --ingest, the landmarks of each clip are extracted straight from the frames
+decoded by ffmpeg into the LandmarkStore, and the clip files are only written with
+--keep-clips.
+
+    python yt_download.py [--jobs 4] [--local-sources folder] [--cache-size 2048]
+                          [--ingest [--keep-clips] [--target-fps 15] [--max-resolution 480]]
+"""
+import argparse
+import hashlib
 import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from shutil import copyfile
+
 import pandas as pd
 from tqdm import tqdm
 
 FOLDER = os.path.join("data", "videos")
+SOURCES_FOLDER = os.path.join("data", "sources")
 
 
-def download_video(name, video_id, start_time, duration_time):
+class YtDlpFetcher(object):
     """
-    start and end have to be in the format mm:ss
+    Download the source videos with yt-dlp, max 720p
     """
-    file_path = os.path.join(FOLDER, name)
-    if not os.path.exists(file_path):
-        os.mkdir(file_path)
-
-    # Configure yt-dlp options
-    ydl_opts = {
-        'format': 'mp4[height<=720]/best[ext=mp4]',  # Prefer mp4 format, max 720p
-        'outtmpl': os.path.join(FOLDER, '%(title)s.%(ext)s'),
-        'quiet': True,  # Suppress yt-dlp output
-        'no_warnings': True,
-    }
-    
-    video_url = f"https://www.youtube.com/watch?v={video_id}"
-    
-    try:
+
+    # Part of the key of the cached sources, a new format downloads them again
+    format = "mp4[height<=720]/best[ext=mp4]"  # Prefer mp4 format, max 720p
+
+    def fetch(self, video_id, path):
+        """
+        :param path: where the mp4 is saved
+        :return: True if the video was downloaded
+        """
+        # Imported here so the script runs with the local stub without yt-dlp
+        import yt_dlp
+
+        base_name = path.replace(".mp4", "")
+        ydl_opts = {
+            "format": self.format,
+            "outtmpl": base_name + ".%(ext)s",
+            "quiet": True,  # Suppress yt-dlp output
+            "no_warnings": True,
+        }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Get video info first
-            info = ydl.extract_info(video_url, download=False)
-            
-            # Check if info extraction was successful
-            if not info or not isinstance(info, dict):
-                print(f"Could not extract info for video {video_id}")
-                return
-            
-            # Get video title safely
-            video_title = info.get('title', f'video_{video_id}')
-            if not video_title:
-                video_title = f'video_{video_id}'
-            
-            # Clean the filename
-            file_name = re.sub(r'[.;:,?!/\\<>:"|*]', "", str(video_title)) + ".mp4"
-            full_video_path = os.path.join(FOLDER, file_name)
-            
-            # Download if not exists
-            if not os.path.exists(full_video_path):
-                try:
-                    # Create a new ydl instance for downloading
-                    download_opts = ydl_opts.copy()
-                    download_opts['outtmpl'] = full_video_path.replace('.mp4', '.%(ext)s')
-                    
-                    with yt_dlp.YoutubeDL(download_opts) as download_ydl:
-                        download_ydl.download([video_url])
-                        
-                    # Check if file was created with different extension
-                    if not os.path.exists(full_video_path):
-                        # Look for the downloaded file with any video extension
-                        base_name = full_video_path.replace('.mp4', '')
-                        for ext in ['.webm', '.mkv', '.mp4', '.avi']:
-                            if os.path.exists(base_name + ext):
-                                # Rename to .mp4 for consistency
-                                os.rename(base_name + ext, full_video_path)
-                                break
-                except Exception as download_error:
-                    print(f"Download failed for {video_id}: {download_error}")
-                    return
-            
-            output_file = os.path.join(file_path, name + "-" + video_id + ".mp4")
-            if os.path.exists(output_file):
-                return
-
-            # Handle video clipping
-            if pd.isna(start_time) and pd.isna(duration_time):
-                # Copy entire video if no time constraints
-                if os.path.exists(full_video_path):
-                    copyfile(src=full_video_path, dst=output_file)
+            ydl.download([f"https://www.youtube.com/watch?v={video_id}"])
+
+        # Look for the downloaded file with any video extension
+        for ext in [".mp4", ".webm", ".mkv", ".avi"]:
+            if os.path.exists(base_name + ext):
+                # Rename to .mp4 for consistency
+                os.replace(base_name + ext, path)
+                return True
+        return False
+
+
+class LocalFetcher(object):
+    """
+    Stand-in for YtDlpFetcher reading the source videos from <source_folder>/<id>.mp4
+    """
+
+    format = "local"
+
+    def __init__(self, source_folder):
+        self.source_folder = source_folder
+
+    def fetch(self, video_id, path):
+        source = os.path.join(self.source_folder, video_id + ".mp4")
+        if not os.path.exists(source):
+            return False
+        copyfile(src=source, dst=path)
+        return True
+
+
+class SourceCache(object):
+    """
+    Source videos kept between runs as data/sources/<id>-<format hash>.mp4, so only
+    the missing ones are fetched. Above max_size bytes, the least recently used
+    sources are deleted (the mtime of a source is updated each time it is used)
+    """
+
+    def __init__(self, fetcher, folder=SOURCES_FOLDER, max_size=2 * 1024**3):
+        """
+        :param fetcher: YtDlpFetcher or LocalFetcher
+        :param max_size: size cap of the cache in bytes, 0 keeps nothing after evict
+        """
+        self.fetcher = fetcher
+        self.folder = folder
+        self.max_size = max_size
+        # Sources used by this run, only evicted by the final evict()
+        self.in_use = set()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, video_id):
+        format_hash = hashlib.sha1(self.fetcher.format.encode()).hexdigest()[:10]
+        return os.path.join(self.folder, f"{video_id}-{format_hash}.mp4")
+
+    def get(self, video_id):
+        """
+        :return: path of the source video, fetched if it is not cached,
+                 None if the fetch failed
+        """
+        path = self.path(video_id)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            # Fetched aside then renamed, so an interrupted fetch is never cached
+            tmp_path = path.replace(".mp4", ".part.mp4")
+            if not self.fetcher.fetch(video_id, tmp_path):
+                return None
+            os.replace(tmp_path, path)
+
+        self.in_use.add(path)
+        self.evict(keep=self.in_use)
+        return path
+
+    def evict(self, keep=()):
+        """
+        Delete the least recently used sources until the cache fits in max_size
+
+        :param keep: paths which are not deleted
+        """
+        sources = [
+            os.path.join(self.folder, file_name)
+            for file_name in os.listdir(self.folder)
+            if file_name.endswith(".mp4") and not file_name.endswith(".part.mp4")
+        ]
+        sources.sort(key=os.path.getmtime, reverse=True)
+        size = 0
+        for source in sources:
+            source_size = os.path.getsize(source)
+            if size + source_size > self.max_size and source not in keep:
+                os.remove(source)
             else:
-                # Use ffmpeg to create clip
-                if os.path.exists(full_video_path):
-                    original_video = full_video_path
-                    try:
-                        if pd.notna(start_time) and pd.notna(duration_time):
-                            # Both start and duration specified
-                            os.system(
-                                f'ffmpeg -hide_banner -loglevel error -ss {start_time} -i "{original_video}" -to {duration_time} -c copy "{output_file}"'
-                            )
-                        elif pd.notna(start_time):
-                            # Only start time specified
-                            os.system(
-                                f'ffmpeg -hide_banner -loglevel error -ss {start_time} -i "{original_video}" -c copy "{output_file}"'
-                            )
-                        else:
-                            # Only duration specified (from beginning)
-                            os.system(
-                                f'ffmpeg -hide_banner -loglevel error -i "{original_video}" -to {duration_time} -c copy "{output_file}"'
-                            )
-                    except Exception as ffmpeg_error:
-                        print(f"FFmpeg error when processing {video_title}: {ffmpeg_error}")
-                else:
-                    print(f"Video file not found: {full_video_path}")
-    
-    except Exception as e:
-        print(f"Error downloading video {video_id}: {e}")
-        # Print more detailed error info for debugging
-        import traceback
-        print(f"Detailed error: {traceback.format_exc()}")
-
-
-print("\nDownloading videos of signs from YouTube\n")
-
-# Create data/videos folder if it doesn't exist
-os.makedirs(FOLDER, exist_ok=True)
-
-# Create the dataset based on yt_links.csv
-df_links = pd.read_csv("yt_links.csv")
-for idx, row in tqdm(df_links.iterrows(), total=df_links.shape[0]):
-    download_video(*row)
-
-# Delete the videos used to create the clips for the dataset
-for file in os.listdir(FOLDER):
-    if file.endswith(".mp4") and not os.path.isdir(os.path.join(FOLDER, file)):
-        try:
-            os.remove(os.path.join(FOLDER, file))
-        except Exception as e:
-            print(f"Could not delete {file}: {e}")
\ No newline at end of file
+                size += source_size
+
+
+def clip_command(source, output_file, start_time=None, duration_time=None):
+    """
+    :param start_time, duration_time: in the format hh:mm:ss.ms, or None
+    :return: ffmpeg arguments cutting the clip, None if the whole video is used
+    """
+    if start_time is None and duration_time is None:
+        return None
+
+    # -nostdin: the clips are cut in parallel, they must not read the terminal
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if start_time is not None:
+        command += ["-ss", str(start_time)]
+    command += ["-i", source]
+    if duration_time is not None:
+        command += ["-to", str(duration_time)]
+    return command + ["-c", "copy", output_file]
+
+
+def cut_clip(source, name, video_id, start_time, duration_time, folder=FOLDER):
+    """
+    Create data/videos/<name>/<name>-<id>.mp4 from the source video
+    """
+    file_path = os.path.join(folder, name)
+    os.makedirs(file_path, exist_ok=True)
+    output_file = os.path.join(file_path, name + "-" + video_id + ".mp4")
+    if os.path.exists(output_file):
+        return
+
+    command = clip_command(source, output_file, start_time, duration_time)
+    if command is None:
+        # Copy entire video if no time constraints
+        copyfile(src=source, dst=output_file)
+        return
+
+    result = subprocess.run(
+        command, stdin=subprocess.DEVNULL, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"FFmpeg error when processing {output_file}: {result.stderr.strip()}")
+
+
+class LandmarkIngester(object):
+    """
+    Extract the landmarks of the clips straight from ffmpeg (see ingest_clip) with
+    a single Holistic, into the LandmarkStore of load_dataset
+    """
+
+    def __init__(self, keep_clips=False, target_fps=None, max_resolution=None):
+        # Imported here as they load mediapipe
+        import mediapipe as mp
+        from utils.dataset_manifest import DatasetManifest
+        from utils.landmark_store import LandmarkStore
+
+        self.store = LandmarkStore()
+        self.manifest = DatasetManifest()
+        self.holistic = mp.solutions.holistic.Holistic(
+            min_detection_confidence=0.5, min_tracking_confidence=0.5
+        )
+        self.keep_clips = keep_clips
+        self.options = {"target_fps": target_fps, "max_resolution": max_resolution}
+
+    def done(self, video_name):
+        return video_name in self.manifest.entries
+
+    def __call__(self, source, name, video_id, start_time, duration_time, folder):
+        from utils.dataset_utils import ingest_clip
+
+        ingest_clip(
+            f"{name}-{video_id}",
+            source,
+            start_time,
+            duration_time,
+            self.store,
+            self.manifest,
+            self.holistic,
+            keep_clip=self.keep_clips,
+            **self.options,
+        )
+
+    def close(self):
+        self.manifest.save()
+        self.holistic.close()
+
+
+def download_videos(df_links, cache, jobs=4, folder=FOLDER, ingester=None):
+    """
+    Get each source video once and cut its clips in a pool of jobs ffmpeg
+    processes, while the next source is fetched
+
+    :param df_links: DataFrame with the columns name, id, start_time, duration_time
+    :param cache: SourceCache the source videos are read from
+    :param ingester: optional LandmarkIngester replacing the clip cutting, run in a
+                     single thread as the clips are appended one at a time to the store
+    :return: paths of the source videos used
+    """
+    if ingester is None:
+
+        def done(video_name):
+            return os.path.exists(
+                os.path.join(folder, video_name.split("-")[0], video_name + ".mp4")
+            )
+
+        cut = cut_clip
+    else:
+        done, cut = ingester.done, ingester
+        jobs = 1
+
+    sources, clips = [], []
+    groups = df_links.groupby("id", sort=False)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for video_id, rows in tqdm(groups, total=groups.ngroups, desc="sources"):
+            # Skip the download when all the clips of the source already exist
+            missing = [
+                row
+                for row in rows.itertuples(index=False)
+                if not done(f"{row.name}-{video_id}")
+            ]
+            if not missing:
+                continue
+
+            try:
+                source = cache.get(video_id)
+            except Exception as e:
+                print(f"Error downloading video {video_id}: {e}")
+                continue
+            if source is None:
+                print(f"Could not download video {video_id}")
+                continue
+            sources.append(source)
+
+            for row in missing:
+                clips.append(
+                    pool.submit(
+                        cut,
+                        source,
+                        row.name,
+                        video_id,
+                        None if pd.isna(row.start_time) else row.start_time,
+                        None if pd.isna(row.duration_time) else row.duration_time,
+                        folder,
+                    )
+                )
+
+        for clip in tqdm(clips, desc="clips"):
+            clip.result()
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--links", default="yt_links.csv")
+    parser.add_argument("--jobs", type=int, default=4, help="parallel ffmpeg processes")
+    parser.add_argument("--local-sources", help="folder of <id>.mp4 replacing YouTube")
+    parser.add_argument(
+        "--cache-size", type=float, default=2048, help="MB of source videos kept"
+    )
+    parser.add_argument("--ingest", action="store_true")
+    parser.add_argument("--keep-clips", action="store_true")
+    parser.add_argument("--target-fps", type=float)
+    parser.add_argument("--max-resolution", type=int)
+    args = parser.parse_args()
+
+    print("\nDownloading videos of signs from YouTube\n")
+
+    # Create data/videos folder if it doesn't exist
+    os.makedirs(FOLDER, exist_ok=True)
+
+    if args.local_sources:
+        fetcher = LocalFetcher(args.local_sources)
+    else:
+        fetcher = YtDlpFetcher()
+
+    ingester = None
+    if args.ingest:
+        ingester = LandmarkIngester(
+            args.keep_clips, args.target_fps, args.max_resolution
+        )
+
+    cache = SourceCache(fetcher, max_size=int(args.cache_size * 1024**2))
+
+    # Create the dataset based on yt_links.csv
+    try:
+        download_videos(pd.read_csv(args.links), cache, args.jobs, ingester=ingester)
+    finally:
+        if ingester is not None:
+            ingester.close()
+
+        # Keep the most recently used source videos within the size cap
+        cache.evict()